@@ -0,0 +1,283 @@
+"""
+Benchmark the media renderers on synthetic inputs, without Discord.
+
+Usage (from the repository root):
+
+    python -m benchmarks.media_bench                      # full suite
+    python -m benchmarks.media_bench --quick              # a few small cases
+    python -m benchmarks.media_bench --filter gif         # cases matching "gif"
+    python -m benchmarks.media_bench --compare old.json   # flag regressions
+
+Every case runs in a fresh process, so its peak RSS is its own. Results are
+written as JSON to benchmarks/results/ (or --output) and can be compared
+against an earlier run with --compare; the exit status is 1 if any case got
+slower, bigger or hungrier than --threshold allows.
+"""
+
+from __future__ import annotations
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from io import BytesIO
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# config refuses to load without these, they are never used here
+os.environ.setdefault("TOKEN", "benchmark")
+os.environ.setdefault("OWNER", "0")
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+CAPTIONS = {
+    "short": "me when",
+    "long": (
+        "when you finally fix the bug at 3am and then realize the real bug was "
+        "the friends we made along the way and also the missing semicolon "
+        "in the config file that nobody reads"
+    ),
+    "unicode": "ｗｈｅｎ the café naïve façade — ¿qué? «ñandú» ÆØÅ ÄÖÜ ßẞ ŁŻŹ ĞŞİ",
+}
+
+
+@dataclass(frozen=True)
+class Workload:
+    """A synthetic input: an image format, a size and a frame count."""
+
+    format: str
+    width: int
+    height: int
+    frames: int = 1
+
+    @property
+    def name(self) -> str:
+        frames = f"x{self.frames}" if self.frames > 1 else ""
+        return f"{self.format.lower()}-{self.width}x{self.height}{frames}"
+
+
+STILLS = [
+    Workload("JPEG", 640, 480),
+    Workload("JPEG", 1920, 1080),
+    Workload("JPEG", 4000, 3000),
+    Workload("PNG", 640, 480),
+    Workload("PNG", 1920, 1080),
+]
+ANIMATIONS = [
+    Workload("GIF", 480, 270, 10),
+    Workload("GIF", 480, 270, 100),
+    Workload("GIF", 320, 240, 500),
+]
+QUICK = [
+    Workload("JPEG", 640, 480),
+    Workload("PNG", 1920, 1080),
+    Workload("GIF", 480, 270, 10),
+]
+
+
+def _frame(width: int, height: int, index: int, rng: np.random.Generator) -> Image.Image:
+    """A photo-like frame: gradients, noise and a moving shape."""
+    yy, xx = np.mgrid[0:height, 0:width]
+    pixels = np.dstack([
+        xx * 255 // max(1, width - 1),
+        yy * 255 // max(1, height - 1),
+        (xx + yy + index * 8) % 256,
+    ]).astype(np.uint8)
+    pixels += rng.integers(0, 16, pixels.shape, dtype=np.uint8)
+
+    frame = Image.fromarray(pixels, "RGB")
+    x = (index * 7) % max(1, width - height // 4)
+    ImageDraw.Draw(frame).ellipse((x, height // 3, x + height // 4, height // 3 + height // 4), fill=(230, 40, 40))
+    return frame
+
+
+def generate(workload: Workload) -> bytes:
+    """Encode a deterministic synthetic input."""
+    rng = np.random.default_rng(0)
+    with BytesIO() as output:
+        if workload.frames > 1:
+            frames = [_frame(workload.width, workload.height, i, rng) for i in range(workload.frames)]
+            frames[0].save(
+                output, format="GIF", save_all=True, append_images=frames[1:],
+                duration=[40 + (i % 3) * 20 for i in range(workload.frames)], loop=0
+            )
+        else:
+            _frame(workload.width, workload.height, 0, rng).save(output, format=workload.format)
+        return output.getvalue()
+
+
+def _peak_rss_kib() -> int:
+    # ru_maxrss survives the fork + exec of spawned workers and would report
+    # the parent's peak, VmHWM is the peak of this process image only
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(data: bytes, command: str, texts: Tuple[Optional[str], ...], repeat: int) -> Dict[str, Any]:
+    """Render one case `repeat` times, after one warm-up run. Runs in a fresh process."""
+    from renderers.render import RenderJob, render_job
+
+    job = RenderJob(command, texts)
+    baseline_rss = _peak_rss_kib()
+
+    started = time.perf_counter()
+    result = render_job(data, job)
+    first = time.perf_counter() - started
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = render_job(data, job)
+        timings.append(time.perf_counter() - started)
+
+    return {
+        "first_ms": first * 1000,
+        "timings_ms": [timing * 1000 for timing in timings],
+        "baseline_rss_kib": baseline_rss,
+        "peak_rss_kib": _peak_rss_kib(),
+        "output_bytes": len(result.data),
+        "output_format": result.format,
+    }
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def cases(workloads: List[Workload]) -> List[Tuple[str, Workload, str, Tuple[Optional[str], ...]]]:
+    """Every (name, workload, command, texts) to run."""
+    result = []
+    for workload in workloads:
+        # Animations are slow, one caption is enough to compare them
+        captions = CAPTIONS if workload.frames == 1 else {"short": CAPTIONS["short"]}
+        for caption_name, caption in captions.items():
+            result.append((
+                f"topbottom/{workload.name}/{caption_name}", workload, "topbottom", (caption, "bottom text")
+            ))
+            result.append((
+                f"caption/{workload.name}/{caption_name}", workload, "caption", (caption,)
+            ))
+    return result
+
+
+def run_suite(workloads: List[Workload], repeat: int, name_filter: Optional[str]) -> Dict[str, Any]:
+    """Run every case matching `name_filter` and summarize it."""
+    context = multiprocessing.get_context("spawn")
+    inputs: Dict[Workload, bytes] = {}
+    results = {}
+
+    for name, workload, command, texts in cases(workloads):
+        if name_filter and name_filter not in name:
+            continue
+        if workload not in inputs:
+            inputs[workload] = generate(workload)
+        runs = repeat if workload.frames < 100 else max(1, repeat // 5)
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            raw = pool.submit(run_case, inputs[workload], command, texts, runs).result()
+
+        timings = raw.pop("timings_ms")
+        results[name] = {
+            **raw,
+            "input_bytes": len(inputs[workload]),
+            "runs": len(timings),
+            "p50_ms": _percentile(timings, 0.5),
+            "p95_ms": _percentile(timings, 0.95),
+            "mean_ms": statistics.fmean(timings),
+        }
+        print(
+            f"{name:<45} p50 {results[name]['p50_ms']:8.1f} ms  p95 {results[name]['p95_ms']:8.1f} ms  "
+            f"rss {raw['peak_rss_kib'] / 1024:7.1f} MiB  out {raw['output_bytes'] / 1024:8.1f} KiB "
+            f"{raw['output_format']}",
+            flush=True,
+        )
+
+    return results
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Describe every case that regressed by more than `threshold` (a fraction)."""
+    regressions = []
+    for name, result in current["cases"].items():
+        old = baseline["cases"].get(name)
+        if old is None:
+            continue
+        for metric in ("p50_ms", "peak_rss_kib", "output_bytes"):
+            if old[metric] and result[metric] > old[metric] * (1 + threshold):
+                regressions.append(
+                    f"{name}: {metric} {old[metric]:.1f} -> {result[metric]:.1f} "
+                    f"(+{(result[metric] / old[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the media renderers on synthetic inputs.")
+    parser.add_argument("--quick", action="store_true", help="only run a few small cases")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per still case")
+    parser.add_argument("--filter", help="only run cases whose name contains this")
+    parser.add_argument("--output", type=Path, help="where to write the JSON results")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression, as a fraction")
+    args = parser.parse_args(argv)
+
+    workloads = QUICK if args.quick else STILLS + ANIMATIONS
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "cases": run_suite(workloads, args.repeat, args.filter),
+    }
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regression over {args.threshold:.0%}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,13 +12,21 @@ from aiohttp import ClientSession
 from logger import logger
 import config
 
+# Discord configuration
+INTENTS = discord.Intents.default()
+INTENTS.message_content = True
+INTENTS.guilds = True
+INTENTS.guild_messages = True
+INTENTS.members = False
+INTENTS.presences = False
+
 class ChezziBot(commands.Bot):
     """Enhanced Discord bot with modern features."""
     
     def __init__(self, http_session: ClientSession, **kwargs):
         super().__init__(
             command_prefix=self._get_prefix,
-            intents=config.INTENTS,
+            intents=INTENTS,
             help_command=None,
             case_insensitive=True,
             strip_after_prefix=True,
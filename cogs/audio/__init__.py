@@ -1,10 +1,23 @@
+import asyncio
+from typing import Dict, Optional
+
 import discord
 from logger import logger
-from io import BytesIO
 from discord.ext import commands
 from bot import ChezziBot
-from utils import reply, FFmpegPCMAudio, TimeoutView
-from .fifteenai import FifteenAIView, save_to_bytesio
+from utils import (
+    AudioMixer, ClipCache, ClipError, PCMClip, PCMVolume, SingleFlight,
+    find_attachment, loudness_gain, safe_send
+)
+from utils.ffmpeg_audio import ffmpeg_audio
+from utils.downloader import Downloader, DownloadTooLarge
+
+AUDIO_TYPES = [
+    "audio/mpeg", "audio/ogg", "audio/wav", "audio/x-wav", "audio/webm",
+    "audio/mp4", "audio/x-m4a", "audio/flac", "video/mp4", "video/webm",
+]
+# Streams are read by ffmpeg over HTTP, which should ride out short drops
+STREAM_BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
 
 
 class Audio(commands.Cog):
@@ -16,13 +29,70 @@ class Audio(commands.Cog):
     def __init__(self, bot: ChezziBot) -> None:
         self.bot = bot
         self.visible = True
+        self.clips = ClipCache()
+        # Clips are cached decoded, their sources need no cache of their own
+        self.downloader = Downloader()
+        self.decodes: SingleFlight[Optional[PCMClip]] = SingleFlight()
+        self.volumes: Dict[int, float] = {}
+
+    @staticmethod
+    def _playing_mixer(voice_client: Optional[discord.VoiceClient]) -> Optional[AudioMixer]:
+        """The mixer the voice client is playing, if any."""
+        if voice_client is None or not voice_client.is_playing():
+            return None
+        source = voice_client.source
+        if isinstance(source, PCMVolume) and isinstance(source.original, AudioMixer):
+            return source.original
+        return None
+
+    async def _voice_client(self, ctx: commands.Context) -> Optional[discord.VoiceClient]:
+        """The guild's voice client, joining the author's channel if needed."""
+        if ctx.voice_client is None:
+            if ctx.author.voice is None or ctx.author.voice.channel is None:
+                await safe_send(ctx, content="Join a voice channel first.")
+                return None
+            await ctx.author.voice.channel.connect()
+        return ctx.voice_client
+
+    def _mix(self, ctx: commands.Context, source: discord.AudioSource, gain: float = 1.0) -> None:
+        """Layer a PCM source over whatever the mixer is already playing."""
+        voice_client = ctx.voice_client
+        mixer = self._playing_mixer(voice_client)
+        if mixer is not None:
+            try:
+                mixer.add(source, gain)
+                return
+            except RuntimeError:
+                # It ended in the meantime
+                pass
+        if voice_client.is_playing():
+            voice_client.stop()
+        mixer = AudioMixer()
+        mixer.add(source, gain)
+        voice_client.play(PCMVolume(mixer, self.volumes.get(ctx.guild.id, 1.0)))
+
+    async def _load_clip(self, attachment: discord.Attachment) -> Optional[PCMClip]:
+        """Get the decoded clip of an attachment, downloading and decoding it the first time."""
+        key = str(attachment.id)
+        clip = await asyncio.to_thread(self.clips.get, key)
+        if clip is not None:
+            return clip
+
+        data = await self.downloader.fetch(
+            self.bot.http_session, attachment.url, declared_size=attachment.size
+        )
+        if data is None:
+            return None
+        clip = await asyncio.to_thread(self.clips.decode, key, data)
+        logger.info(f"Decoded soundboard clip {key}: {clip.duration:.1f}s")
+        return clip
 
     @commands.command()
     async def join(self, ctx: commands.Context, *, channel: discord.VoiceChannel):
         """Joins a voice channel"""
 
         if ctx.voice_client is not None:
-            return await ctx.voice_client.move_to()
+            return await ctx.voice_client.move_to(channel)
 
         await channel.connect()
 
@@ -31,3 +101,93 @@ class Audio(commands.Cog):
         """Stops and disconnects the bot from voice"""
 
         await ctx.voice_client.disconnect()
+
+    @commands.command(name="soundboard", aliases=["sb"])
+    @commands.guild_only()
+    async def soundboard(self, ctx: commands.Context):
+        """
+        Play an audio clip in the voice channel.
+
+        Attach the clip or reply to a message with it. Clips are decoded
+        once, playing the same clip again starts instantly. Clips played
+        while others are still playing are mixed over them.
+        """
+        if await self._voice_client(ctx) is None:
+            return
+
+        found = await find_attachment(ctx.message, {"audio": AUDIO_TYPES})
+        if found is None:
+            await safe_send(ctx, content="Please attach an audio clip or reply to a message with one.")
+            return
+        attachment, _ = found
+
+        try:
+            clip = await self.decodes.run(attachment.id, lambda: self._load_clip(attachment))
+        except DownloadTooLarge as e:
+            await safe_send(ctx, content=f"Clips up to {e.max_bytes / 1024 ** 2:.0f} MiB can be played.")
+            return
+        except ClipError as e:
+            logger.warning(f"Could not decode soundboard clip {attachment.id}: {e}")
+            await safe_send(ctx, content="This clip could not be played.")
+            return
+        if clip is None:
+            await safe_send(ctx, content="This clip could not be downloaded.")
+            return
+
+        if ctx.voice_client is None:
+            return
+        # Clips are normalized so they all play about as loud
+        self._mix(ctx, clip.source(), loudness_gain(clip.loudness))
+
+    @commands.command()
+    @commands.guild_only()
+    async def play(self, ctx: commands.Context):
+        """
+        Stream an audio file in the voice channel.
+
+        Attach the file or reply to a message with it. It is streamed by
+        ffmpeg rather than downloaded first, so long files start right
+        away. At 100% volume ffmpeg also encodes the Opus sent to Discord;
+        otherwise, or while clips play, the stream is mixed like a clip.
+        Soundboard clips stop an Opus stream.
+        """
+        voice_client = await self._voice_client(ctx)
+        if voice_client is None:
+            return
+
+        found = await find_attachment(ctx.message, {"audio": AUDIO_TYPES})
+        if found is None:
+            await safe_send(ctx, content="Please attach an audio file or reply to a message with one.")
+            return
+        attachment, _ = found
+
+        # Opus passthrough unless the samples go through the mixer or the volume
+        passthrough = self.volumes.get(ctx.guild.id, 1.0) == 1.0 and self._playing_mixer(voice_client) is None
+        try:
+            source = ffmpeg_audio(attachment.url, pcm=not passthrough, before_options=STREAM_BEFORE_OPTIONS)
+        except discord.ClientException as e:
+            logger.error(f"Could not start ffmpeg: {e}")
+            await safe_send(ctx, content="Audio playback is not available right now.")
+            return
+
+        if passthrough:
+            if voice_client.is_playing():
+                voice_client.stop()
+            voice_client.play(source)
+        else:
+            self._mix(ctx, source)
+        await safe_send(ctx, content=f"Playing {attachment.filename}")
+
+    @commands.command()
+    @commands.guild_only()
+    async def volume(self, ctx: commands.Context, percent: commands.Range[int, 0, 200]):
+        """Sets the playback volume, in percent"""
+
+        self.volumes[ctx.guild.id] = percent / 100
+        if ctx.voice_client is not None and isinstance(ctx.voice_client.source, PCMVolume):
+            ctx.voice_client.source.volume = percent / 100
+        await safe_send(ctx, content=f"Volume set to {percent}%")
+
+
+async def setup(bot: ChezziBot):
+    await bot.add_cog(Audio(bot))
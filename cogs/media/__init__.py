@@ -1,27 +1,210 @@
 """Enhanced Media cog with better error handling and modern features."""
 
 from __future__ import annotations
-from typing import Optional
+import asyncio
+from dataclasses import replace
+from typing import Dict, Hashable, Optional
 
 import discord
 from discord.ext import commands
-from PIL import Image as PILImage, ImageSequence
 from io import BytesIO
 
 from bot import ChezziBot
-from utils.message_utils import safe_send
-from utils.get_attachment import get_attachment
-from .topbottom import handle_image, handle_gif, TopBottomFlags
-from .caption import caption_image, caption_gif
+from utils.message_utils import safe_send, safe_reply
+from utils.downloader import Downloader, DownloadTooLarge
+from utils.job_scheduler import FairScheduler, PositionBroadcast, PositionCallback, QueueFull
+from utils.get_attachment import find_attachment, resized_proxy_url
+from utils.media_decode import plan_decode
+from utils.render_cache import RenderCache, normalize_text, render_cache_key
+from utils.render_executor import RenderExecutor
+from utils.single_flight import SingleFlight
+from renderers.render import RenderJob, RenderedMedia, render_media, render_video
+from .topbottom import TopBottomFlags
 from logger import logger
 import config
 
+IMAGE_TYPES = ["image/jpeg", "image/jpg", "image/png"]
+GIF_TYPES = ["image/gif"]
+VIDEO_TYPES = ["video/mp4", "video/webm", "video/quicktime"]
+MEDIA_KINDS = {"image": IMAGE_TYPES, "gif": GIF_TYPES, "video": VIDEO_TYPES}
+SUPPORTED_FORMATS = "JPG, JPEG, PNG, GIF, MP4, WEBM, MOV"
+
 class Media(commands.Cog, name="Media"):
-    """Image and GIF processing commands for memes and media manipulation."""
+    """Image, GIF and video processing commands for memes and media manipulation."""
 
     def __init__(self, bot: ChezziBot) -> None:
         self.bot = bot
         self.visible = True
+        self.executor = RenderExecutor()
+        self.cache = RenderCache()
+        self.downloader = Downloader(cache=RenderCache(
+            directory=config.DOWNLOAD_CACHE_DIR,
+            memory_bytes=0,
+            disk_bytes=config.DOWNLOAD_CACHE_DISK_BYTES,
+            ttl=config.DOWNLOAD_CACHE_TTL,
+        ))
+        self.scheduler = FairScheduler()
+        self.downloads: SingleFlight[Optional[bytes]] = SingleFlight()
+        self.renders: SingleFlight[RenderedMedia] = SingleFlight()
+        # Everyone waiting on a shared render, keyed like the renders
+        self.positions: Dict[Hashable, PositionBroadcast] = {}
+
+    async def cog_load(self) -> None:
+        self.executor.warm()
+
+    async def cog_unload(self) -> None:
+        self.executor.shutdown()
+
+    async def _download(self, attachment: discord.Attachment, kind: str) -> Optional[bytes]:
+        """
+        Download an attachment, at the size it will be rendered at if it is a still.
+
+        Discord's media proxy resizes images on its side; animations are
+        always downloaded as they are, since the proxy may not keep them
+        animated.
+        """
+        if kind == "image" and attachment.width and attachment.height:
+            target = plan_decode((attachment.width, attachment.height)).size
+            variant_url = resized_proxy_url(attachment, target)
+            if variant_url is not None:
+                return await self.downloader.fetch_variant(
+                    self.bot.http_session, variant_url, attachment.url,
+                    key=attachment.id, declared_size=attachment.size
+                )
+
+        return await self.downloader.fetch(
+            self.bot.http_session, attachment.url,
+            key=attachment.id, declared_size=attachment.size
+        )
+
+    async def _render_cached(
+        self,
+        data: bytes,
+        job: RenderJob,
+        kind: str,
+        size_limit: int,
+        owner: int,
+        on_position: Optional[PositionCallback] = None
+    ) -> RenderedMedia:
+        key = render_cache_key(data, job.command, job.texts, size_limit=size_limit)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return RenderedMedia(*cached)
+
+        async with self.scheduler.slot(owner, on_position):
+            renderer = render_video if kind == "video" else render_media
+            result = await renderer(self.executor, data, job, size_limit)
+        logger.info(
+            f"Rendered {job.command} as {result.format}: {len(result.data)} bytes "
+            f"in {result.elapsed:.2f}s ({result.attempts} attempts)"
+        )
+        await asyncio.to_thread(self.cache.put, key, result.data, result.format)
+        return result
+
+    async def _report_too_large(
+        self,
+        ctx: commands.Context,
+        processing_msg: Optional[discord.Message],
+        error: DownloadTooLarge
+    ) -> None:
+        error_embed = discord.Embed(
+            title="❌ File Too Large",
+            description=f"Files up to {error.max_bytes / 1024 ** 2:.0f} MiB can be processed.",
+            color=discord.Color.red()
+        )
+        if processing_msg:
+            await processing_msg.edit(embed=error_embed)
+        else:
+            await safe_send(ctx, embed=error_embed)
+
+    async def _report_busy(
+        self,
+        ctx: commands.Context,
+        processing_msg: Optional[discord.Message]
+    ) -> None:
+        error_embed = discord.Embed(
+            title="⏳ Too Busy",
+            description="Too many images are being processed right now, please try again in a moment.",
+            color=discord.Color.orange()
+        )
+        if processing_msg:
+            await processing_msg.edit(embed=error_embed)
+        else:
+            await safe_send(ctx, embed=error_embed)
+
+    async def _render_attachment(
+        self,
+        ctx: commands.Context,
+        processing_msg: Optional[discord.Message],
+        job: RenderJob
+    ) -> bool:
+        """
+        Render the attachment of the message, or of the message it replies
+        to, in a worker and reply with it.
+
+        Outputs are cached by content, so the same image with the same text
+        is only rendered once. Concurrent requests for the same attachment
+        share one download, and share one render if they also ask for the
+        same thing; each still gets its own reply.
+
+        Renders are admitted by the fair scheduler, and the processing
+        message of every request sharing a render shows its position in the
+        queue while waiting.
+
+        Returns False if there is no supported attachment or it could not be
+        downloaded.
+        """
+        job = replace(job, texts=tuple(normalize_text(text) for text in job.texts))
+        size_limit = ctx.guild.filesize_limit if ctx.guild else discord.utils.DEFAULT_FILE_SIZE_LIMIT_BYTES
+
+        found = await find_attachment(ctx.message, MEDIA_KINDS)
+        if found is None:
+            return False
+        attachment, kind = found
+
+        data = await self.downloads.run(attachment.id, lambda: self._download(attachment, kind))
+        if data is None:
+            return False
+
+        queued: list[int] = []
+
+        async def show_position(position: int) -> None:
+            if processing_msg is None or (position == 0 and not queued):
+                return
+            queued.append(position)
+            embed = processing_msg.embeds[0].copy() if processing_msg.embeds else discord.Embed()
+            embed.set_footer(text=f"Position in queue: {position}" if position else None)
+            await processing_msg.edit(embed=embed)
+
+        async def broadcast_position(position: int) -> None:
+            # Looked up on every call, since the waiters may all leave and others join
+            positions = self.positions.get(render_key)
+            if positions is not None:
+                await positions(position)
+
+        owner = ctx.guild.id if ctx.guild else ctx.author.id
+        render_key = (attachment.id, job, size_limit)
+        positions = self.positions.setdefault(render_key, PositionBroadcast())
+        try:
+            await positions.add(show_position)
+            result = await self.renders.run(
+                render_key,
+                lambda: self._render_cached(data, job, kind, size_limit, owner, broadcast_position)
+            )
+        finally:
+            positions.remove(show_position)
+            if not positions and self.positions.get(render_key) is positions:
+                del self.positions[render_key]
+
+        # Delete processing message
+        if processing_msg:
+            await processing_msg.delete()
+
+        await safe_reply(
+            ctx.message,
+            file=discord.File(fp=BytesIO(result.data), filename=result.filename)
+        )
+        return True
 
     @commands.command(
         name="topbottom",
@@ -35,13 +218,13 @@ class Media(commands.Cog, name="Media"):
         flags: TopBottomFlags
     ):
         """
-        Add top and bottom text to images and GIFs using Impact font.
+        Add top and bottom text to images, GIFs and videos using Impact font.
         
         **Parameters:**
         - `top`: (Optional) The text to add at the top
         - `bottom`: (Optional) The text to add at the bottom
         
-        **Supported formats:** JPG, JPEG, PNG, GIF
+        **Supported formats:** JPG, JPEG, PNG, GIF, MP4, WEBM, MOV
         
         **Usage:** 
         - `{prefix}topbottom top: "When you" bottom: "Bottom text"`
@@ -72,48 +255,10 @@ class Media(commands.Cog, name="Media"):
         processing_msg = await safe_send(ctx, embed=processing_embed)
 
         try:
-            # Try to get image attachment
-            img_attachment = await get_attachment(
-                ctx.message, 
-                ["image/jpeg", "image/jpg", "image/png"]
-            )
-            
-            if img_attachment:
-                async with self.bot.http_session.get(img_attachment.url) as response:
-                    if response.status == 200:
-                        img_bytes = BytesIO(await response.read())
-                        img = PILImage.open(img_bytes)
-                        
-                        # Delete processing message
-                        if processing_msg:
-                            await processing_msg.delete()
-                        
-                        await handle_image(
-                            ctx, img, img_attachment.width, 
-                            img_attachment.height, flags.top, flags.bottom
-                        )
-                        return
-            
-            # Try to get GIF attachment
-            gif_attachment = await get_attachment(ctx.message, "image/gif")
-            
-            if gif_attachment:
-                async with self.bot.http_session.get(gif_attachment.url) as response:
-                    if response.status == 200:
-                        gif_bytes = BytesIO(await response.read())
-                        gif_img = PILImage.open(gif_bytes)
-                        
-                        # Delete processing message
-                        if processing_msg:
-                            await processing_msg.delete()
-                        
-                        await handle_gif(
-                            ctx, ImageSequence.Iterator(gif_img),
-                            gif_attachment.width, gif_attachment.height,
-                            flags.top, flags.bottom
-                        )
-                        return
-            
+            job = RenderJob("topbottom", (flags.top, flags.bottom))
+            if await self._render_attachment(ctx, processing_msg, job):
+                return
+
             # No attachment found
             error_embed = discord.Embed(
                 title="❌ No Image Found",
@@ -122,7 +267,7 @@ class Media(commands.Cog, name="Media"):
             )
             error_embed.add_field(
                 name="Supported Formats",
-                value="JPG, JPEG, PNG, GIF",
+                value=SUPPORTED_FORMATS,
                 inline=False
             )
             
@@ -131,6 +276,12 @@ class Media(commands.Cog, name="Media"):
             else:
                 await safe_send(ctx, embed=error_embed)
                 
+        except DownloadTooLarge as e:
+            await self._report_too_large(ctx, processing_msg, e)
+
+        except QueueFull:
+            await self._report_busy(ctx, processing_msg)
+
         except Exception as e:
             logger.error(f"Error in topbottom command: {e}")
             error_embed = discord.Embed(
@@ -151,12 +302,12 @@ class Media(commands.Cog, name="Media"):
     )
     async def write_caption(self, ctx: commands.Context, *, caption: str):
         """
-        Add a caption above an image or GIF.
+        Add a caption above an image, GIF or video.
         
         **Parameters:**
         - `caption`: The text to add as a caption
         
-        **Supported formats:** JPG, JPEG, PNG, GIF
+        **Supported formats:** JPG, JPEG, PNG, GIF, MP4, WEBM, MOV
         
         **Usage:** 
         - `{prefix}caption This is my caption`
@@ -187,47 +338,10 @@ class Media(commands.Cog, name="Media"):
         processing_msg = await safe_send(ctx, embed=processing_embed)
 
         try:
-            # Try to get image attachment
-            img_attachment = await get_attachment(
-                ctx.message, 
-                ["image/jpeg", "image/jpg", "image/png"]
-            )
-            
-            if img_attachment:
-                async with self.bot.http_session.get(img_attachment.url) as response:
-                    if response.status == 200:
-                        img_bytes = BytesIO(await response.read())
-                        img = PILImage.open(img_bytes)
-                        
-                        # Delete processing message
-                        if processing_msg:
-                            await processing_msg.delete()
-                        
-                        await caption_image(
-                            ctx, img, img_attachment.width,
-                            img_attachment.height, caption
-                        )
-                        return
-            
-            # Try to get GIF attachment
-            gif_attachment = await get_attachment(ctx.message, "image/gif")
-            
-            if gif_attachment:
-                async with self.bot.http_session.get(gif_attachment.url) as response:
-                    if response.status == 200:
-                        gif_bytes = BytesIO(await response.read())
-                        gif_img = PILImage.open(gif_bytes)
-                        
-                        # Delete processing message
-                        if processing_msg:
-                            await processing_msg.delete()
-                        
-                        await caption_gif(
-                            ctx, ImageSequence.Iterator(gif_img),
-                            gif_attachment.width, gif_attachment.height, caption
-                        )
-                        return
-            
+            job = RenderJob("caption", (caption,))
+            if await self._render_attachment(ctx, processing_msg, job):
+                return
+
             # No attachment found
             error_embed = discord.Embed(
                 title="❌ No Image Found",
@@ -236,7 +350,7 @@ class Media(commands.Cog, name="Media"):
             )
             error_embed.add_field(
                 name="Supported Formats",
-                value="JPG, JPEG, PNG, GIF",
+                value=SUPPORTED_FORMATS,
                 inline=False
             )
             
@@ -245,6 +359,12 @@ class Media(commands.Cog, name="Media"):
             else:
                 await safe_send(ctx, embed=error_embed)
                 
+        except DownloadTooLarge as e:
+            await self._report_too_large(ctx, processing_msg, e)
+
+        except QueueFull:
+            await self._report_busy(ctx, processing_msg)
+
         except Exception as e:
             logger.error(f"Error in caption command: {e}")
             error_embed = discord.Embed(
@@ -258,6 +378,60 @@ class Media(commands.Cog, name="Media"):
             else:
                 await safe_send(ctx, embed=error_embed)
 
+    @commands.command(name="mediastats", hidden=True)
+    @commands.is_owner()
+    async def media_stats(self, ctx: commands.Context):
+        """Show render cache, download and queue metrics."""
+        info = self.cache.info()
+        embed = discord.Embed(title="📊 Media Cache", color=discord.Color.blue())
+        embed.add_field(
+            name="Memory",
+            value=f"{info['memory_entries']} entries, {info['memory_bytes'] / 1024 ** 2:.1f} MiB",
+            inline=True
+        )
+        embed.add_field(
+            name="Disk",
+            value=f"{info['disk_entries']} entries, {info['disk_bytes'] / 1024 ** 2:.1f} MiB",
+            inline=True
+        )
+        embed.add_field(
+            name="Lookups",
+            value=(
+                f"{info['memory_hits']} memory hits, {info['disk_hits']} disk hits, "
+                f"{info['misses']} misses ({info['hit_rate']:.0%} hit rate)\n"
+                f"{info['evictions']} evictions, {info['expirations']} expirations"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Downloads",
+            value=(
+                f"{self.downloader.bytes_downloaded / 1024 ** 2:.1f} MiB downloaded, "
+                f"{self.downloader.bytes_saved / 1024 ** 2:.1f} MiB saved by resized variants"
+            ),
+            inline=False
+        )
+        queue = self.scheduler.info()
+        embed.add_field(
+            name="Queue",
+            value=(
+                f"{queue['running']} running, {queue['queued']} queued "
+                f"({queue['guilds_waiting']} guilds waiting)\n"
+                f"{queue['completed']} completed, {queue['rejected']} rejected\n"
+                f"Wait p50 {queue['wait_p50']:.1f}s, p95 {queue['wait_p95']:.1f}s"
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name="Shared Jobs",
+            value=(
+                f"{self.downloads.shared}/{self.downloads.started + self.downloads.shared} downloads, "
+                f"{self.renders.shared}/{self.renders.started + self.renders.shared} renders"
+            ),
+            inline=False
+        )
+        await safe_send(ctx, embed=embed)
+
 async def setup(bot: ChezziBot):
     """Set up the Media cog."""
     await bot.add_cog(Media(bot))
@@ -1,6 +1,5 @@
 """Configuration module for ChezziBot."""
 import os
-import discord
 from pathlib import Path
 from typing import Optional
 
@@ -27,22 +26,80 @@ BASE_DIR = Path(__file__).parent
 ASSETS_DIR = BASE_DIR / "assets"
 FONTS_DIR = ASSETS_DIR / "fonts"
 JSONS_DIR = ASSETS_DIR / "jsons"
+IMPACT_FONT = FONTS_DIR / "unicode.impact.ttf"
+CACHE_DIR = BASE_DIR / "cache"
 
 # External tools
 FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
-
-# Discord configuration
-INTENTS = discord.Intents.default()
-INTENTS.message_content = True
-INTENTS.guilds = True
-INTENTS.guild_messages = True
-INTENTS.members = False
-INTENTS.presences = False
+FFPROBE_PATH = os.getenv("FFPROBE_PATH", "ffprobe")
 
 # Bot settings
 MAX_FIELDS_PER_EMBED = 10
 COMMAND_TIMEOUT = 300.0  # 5 minutes
 MAX_MESSAGE_LENGTH = 2000
+MESSAGE_CACHE_SIZE = 256  # referenced messages fetched from the API
+MESSAGE_CACHE_TTL = 300.0  # seconds
+
+# Media settings
+FONT_CACHE_SIZE = 64  # sized fonts kept per process
+GLYPH_ADVANCE_CACHE_SIZE = 8192  # measured (font, size, word) advances
+LAYOUT_CACHE_SIZE = 256  # wrapped text layouts
+GLYPH_ATLAS_CACHE_SIZE = 512  # rasterized (font, size, stroke, char) glyph masks
+FONT_FIT_CACHE_SIZE = 1024  # memoized font size searches
+MAX_FONT_SIZE = 500
+MEDIA_EXECUTOR = os.getenv("MEDIA_EXECUTOR", "process")  # "process" or "thread"
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", min(2, os.cpu_count() or 1)))  # ~70 MB each
+GIF_PALETTE = "global"  # "global" (shared adaptive palette) or "local" (per frame)
+GIF_PALETTE_SAMPLES = 8  # frames sampled for the global palette
+GIF_PALETTE_SAMPLE_SIZE = 128  # sampled frames are shrunk to fit this box
+MEDIA_GIF_CHUNK_SIZE = int(os.getenv("MEDIA_GIF_CHUNK_SIZE", 64))  # frames per parallel render job
+MEDIA_MAX_WORKERS_PER_JOB = int(os.getenv("MEDIA_MAX_WORKERS_PER_JOB", 4))
+MEDIA_MAX_DIMENSION = int(os.getenv("MEDIA_MAX_DIMENSION", 1024))  # longest side media is decoded at
+MEDIA_MIN_DIMENSION = 256  # the pixel budget drops frames rather than shrink below this
+MEDIA_PIXEL_BUDGET = int(os.getenv("MEDIA_PIXEL_BUDGET", 40_000_000))  # width x height x frames
+MEDIA_PNG_COMPRESS_LEVEL = 1  # zlib level, higher levels cost far more time than they save bytes
+MEDIA_PNG_MAX_COLORS = 256  # opaque stills with more colours are only tried as WebP
+MEDIA_WEBP_QUALITY = 85
+MEDIA_WEBP_QUALITIES = (85, 70, 55, 40)  # lossy WebP qualities tried until the output fits
+MEDIA_OUTPUT_SCALES = (1.0, 0.75, 0.5, 0.35)  # still image scales tried until the output fits
+MEDIA_ANIMATION_STEPS = ((1.0, 255), (1.0, 128), (0.75, 128), (0.5, 64), (0.35, 64))  # (scale, colours) of oversized animations
+MEDIA_VIDEO_MAX_SECONDS = float(os.getenv("MEDIA_VIDEO_MAX_SECONDS", 60))  # longer videos are cut
+MEDIA_VIDEO_MAX_DIMENSION = int(os.getenv("MEDIA_VIDEO_MAX_DIMENSION", 720))  # longest side of output videos
+MEDIA_VIDEO_TIMEOUT = float(os.getenv("MEDIA_VIDEO_TIMEOUT", 120))  # seconds ffmpeg may take per video
+MEDIA_VIDEO_CRF = int(os.getenv("MEDIA_VIDEO_CRF", 26))
+MEDIA_VIDEO_AUDIO_BITRATE = 96_000  # bits per second
+MEDIA_MAX_RUNNING_JOBS = int(os.getenv("MEDIA_MAX_RUNNING_JOBS", 4))  # renders admitted at once
+MEDIA_MAX_JOBS_PER_GUILD = int(os.getenv("MEDIA_MAX_JOBS_PER_GUILD", 2))
+MEDIA_MAX_QUEUED_JOBS = int(os.getenv("MEDIA_MAX_QUEUED_JOBS", 50))
+MEDIA_QUEUE_UPDATE_INTERVAL = 3.0  # seconds between queue position updates of a job
+MEDIA_QUEUE_WAIT_SAMPLES = 200  # recent queue waits kept for percentiles
+RENDER_CACHE_DIR = CACHE_DIR / "renders"
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv("RENDER_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+RENDER_CACHE_DISK_BYTES = int(os.getenv("RENDER_CACHE_DISK_BYTES", 1024 * 1024 * 1024))
+RENDER_CACHE_TTL = 7 * 24 * 3600  # seconds
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", 25 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 60.0  # seconds, whole download
+DOWNLOAD_CONNECT_TIMEOUT = 10.0
+DOWNLOAD_READ_TIMEOUT = 20.0  # between two chunks
+DOWNLOAD_CACHE_DIR = CACHE_DIR / "attachments"
+DOWNLOAD_CACHE_DISK_BYTES = int(os.getenv("DOWNLOAD_CACHE_DISK_BYTES", 512 * 1024 * 1024))
+DOWNLOAD_CACHE_TTL = 24 * 3600  # seconds
+
+# Audio settings
+AUDIO_READ_AHEAD_FRAMES = 50  # 20 ms frames decoded ahead of playback
+AUDIO_PIPE_CHUNK_SIZE = 64 * 1024  # bytes written to ffmpeg's stdin at a time
+AUDIO_OPUS_BITRATE = 128  # kbps of streams ffmpeg encodes to Opus
+SOUNDBOARD_CACHE_DIR = CACHE_DIR / "clips"  # decoded soundboard clips
+SOUNDBOARD_CACHE_DISK_BYTES = int(os.getenv("SOUNDBOARD_CACHE_DISK_BYTES", 256 * 1024 * 1024))
+SOUNDBOARD_MAPPED_CLIPS = 32  # clips kept memory-mapped
+SOUNDBOARD_MAX_SECONDS = 30.0  # longer clips are cut
+SOUNDBOARD_DECODE_TIMEOUT = 30.0  # seconds ffmpeg may take per clip
+AUDIO_MIXER_MAX_TRACKS = 8  # sources mixed at once, the oldest fades out past it
+AUDIO_MIXER_FADE_SECONDS = 0.1  # fade of tracks pushed out of a full mixer
+AUDIO_LOUDNESS_TARGET = -16.0  # LUFS clips are normalized to
+AUDIO_LOUDNESS_MAX_GAIN = 12.0  # dB of normalization gain, up or down
+AUDIO_LOUDNESS_HISTORY = 10.0  # seconds of audio the loudness is measured over
 
 # Logging configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
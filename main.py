@@ -5,17 +5,18 @@ import signal
 import sys
 from contextlib import asynccontextmanager
 
-import aiohttp
-import discord
-from discord.ext import commands
-
 import config
-from bot import ChezziBot
 from logger import logger
 
+# discord, aiohttp and the bot are imported when the bot starts: render
+# workers are spawned processes, which run this module's top level again
+
 @asynccontextmanager
 async def create_bot():
     """Create and manage bot instance with proper cleanup."""
+    import aiohttp
+    from bot import ChezziBot
+
     async with aiohttp.ClientSession() as session:
         bot = ChezziBot(http_session=session)
         try:
@@ -25,6 +26,8 @@ async def create_bot():
 
 async def main():
     """Main bot runner with graceful shutdown."""
+    import discord
+
     # Set up signal handlers for graceful shutdown
     def signal_handler(signum, frame):
         logger.info(f"Received signal {signum}, shutting down...")
@@ -0,0 +1,5 @@
+"""
+Media rendering, run by the render workers.
+
+Nothing here imports discord, so the worker processes stay small.
+"""
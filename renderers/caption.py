@@ -0,0 +1,55 @@
+from functools import partial
+from pathlib import Path
+from typing import Callable, Tuple, Union
+from PIL import Image
+import config
+from utils.font_fit import fit_font_size
+from utils.image_text import ImageText
+from utils.text_layout import layout_text
+
+
+def get_font_size(text: str, width: int, height: int, img_fraction: float, font_name: Union[str, Path]) -> int:
+    breakpoint = int(img_fraction * min(height, (width + height) // 2))
+    return fit_font_size(text, font_name, max_height=max(1, breakpoint - 1))
+
+
+def render_header(width: int, height: int, text: str) -> Image.Image:
+    """
+    Render a white canvas with `text` above room for a `width` x `height` image.
+
+    The image itself goes at the bottom of the canvas, see `paste_under_header`.
+    """
+    font_name = config.IMPACT_FONT
+    fontsize = get_font_size(
+        text, width, height, 0.1, font_name)
+    margin = min(width, height) // 30
+    layout = layout_text(text, font_name, fontsize, width - 2 * margin)
+    new_height = int(layout.total_height) + 2 * margin + height
+    img = ImageText((width, new_height), background=(255, 255, 255, 255))
+    img.draw_layout((margin, margin), layout, width - 2 * margin, (0, 0, 0), 'center')
+    return img.image
+
+
+def paste_under_header(header: Image.Image, image: Image.Image) -> Image.Image:
+    """Paste `image` under a copy of a rendered caption header."""
+    canvas = header.copy()
+    canvas.paste(image, (0, header.height - image.height))
+    return canvas
+
+
+def compositor(width: int, height: int, text: str) -> Callable[[Image.Image], Image.Image]:
+    """Get the function that turns a source frame into an output frame."""
+    header = render_header(width, height, text)
+    return partial(paste_under_header, header)
+
+
+def video_overlay(width: int, height: int, text: str) -> Tuple[Image.Image, Tuple[int, int]]:
+    """
+    Get the layer ffmpeg composites over a `width` x `height` video, and where the video goes.
+
+    The header is cut open where the video shows through.
+    """
+    header = render_header(width, height, text).convert('RGBA')
+    top = header.height - height
+    header.paste((0, 0, 0, 0), (0, top, width, header.height))
+    return header, (0, top)
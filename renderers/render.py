@@ -0,0 +1,264 @@
+"""Media rendering jobs, run in the render executor away from the event loop."""
+
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, replace
+from io import BytesIO
+import time
+from typing import Callable, Optional, Tuple, Union
+
+from PIL import Image
+
+import config
+from utils.ffmpeg_video import fit_video, overlay_video, probe_video, video_file
+from utils.gif_encoder import GIF_TRAILER, encode_animation, encode_frames, plan_animation
+from utils.media_decode import DecodePlan, open_media, scale_frame
+from utils.media_output import EXTENSIONS, EncodedMedia, gif_to_webp, negotiate_still
+from utils.render_executor import RenderExecutor
+from . import topbottom, caption
+
+# Frame compositor of every command
+RENDERERS = {
+    "topbottom": topbottom.compositor,
+    "caption": caption.compositor,
+}
+
+# Video overlay of every command, composited by ffmpeg
+VIDEO_OVERLAYS = {
+    "topbottom": topbottom.video_overlay,
+    "caption": caption.video_overlay,
+}
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    """What to render: a Media command, its texts and the output settings."""
+
+    command: str
+    texts: Tuple[Optional[str], ...]
+    scale: float = 1.0
+    colors: int = 255
+
+    def compositor(self, width: int, height: int) -> Callable[[Image.Image], Image.Image]:
+        return RENDERERS[self.command](width, height, *self.texts)
+
+    def frame_compositor(self, plan: DecodePlan) -> Callable[[Image.Image], Image.Image]:
+        """Compositor that first scales source frames to the planned size."""
+        compose = self.compositor(*plan.size)
+        return lambda frame: compose(scale_frame(frame, plan.size))
+
+
+@dataclass
+class RenderedMedia:
+    """Encoded output of a render job."""
+
+    data: bytes
+    format: str
+    attempts: int = 1
+    elapsed: float = 0.0
+
+    @property
+    def filename(self) -> str:
+        return f"unknown.{EXTENSIONS[self.format]}"
+
+    @classmethod
+    def from_encoded(cls, encoded: EncodedMedia) -> RenderedMedia:
+        return cls(encoded.data, encoded.format, encoded.attempts)
+
+
+@dataclass
+class AnimationPlan:
+    """A long animation to be rendered in chunks of frames."""
+
+    header: bytes
+    palette: Optional[Image.Image]
+    n_frames: int
+    stride: int
+
+
+def _render(
+        img: Image.Image,
+        plan: DecodePlan,
+        job: RenderJob,
+        size_limit: Optional[int]) -> RenderedMedia:
+    if img.format == 'GIF':
+        return RenderedMedia(
+            encode_animation(
+                img, job.frame_compositor(plan),
+                stride=plan.stride, colors=job.colors
+            ),
+            'GIF'
+        )
+
+    rendered = job.compositor(img.width, img.height)(img)
+    return RenderedMedia.from_encoded(negotiate_still(rendered, size_limit))
+
+
+def render_job(data: bytes, job: RenderJob, size_limit: Optional[int] = None) -> RenderedMedia:
+    """Decode `data` within the pixel budget, render `job` on it and encode the result."""
+    img, plan = open_media(data, job.scale)
+    return _render(img, plan, job, size_limit)
+
+
+def plan_job(
+        data: bytes,
+        job: RenderJob,
+        size_limit: Optional[int] = None,
+        split: bool = True) -> Union[RenderedMedia, AnimationPlan]:
+    """
+    Render `job` right away, unless it is a GIF long enough to be split.
+
+    Long GIFs get their header and shared palette computed instead, and are
+    then rendered chunk by chunk with `render_chunk`. With `split` False,
+    nothing is split.
+    """
+    img, plan = open_media(data, job.scale)
+    n_frames = getattr(img, 'n_frames', 1)
+
+    if not split or img.format != 'GIF' or n_frames <= config.MEDIA_GIF_CHUNK_SIZE * plan.stride:
+        return _render(img, plan, job, size_limit)
+
+    header, palette = plan_animation(img, job.frame_compositor(plan), colors=job.colors)
+    return AnimationPlan(header, palette, n_frames, plan.stride)
+
+
+def render_chunk(
+        data: bytes,
+        job: RenderJob,
+        palette: Optional[Image.Image],
+        start: int,
+        stop: int) -> bytes:
+    """Render and encode frames [start, stop) of an animation."""
+    img, plan = open_media(data, job.scale)
+    return encode_frames(
+        img, job.frame_compositor(plan), palette,
+        start, stop, plan.stride, job.colors
+    )
+
+
+async def _render_once(
+        executor: RenderExecutor,
+        data: bytes,
+        job: RenderJob,
+        size_limit: Optional[int]) -> RenderedMedia:
+    # Chunks only pay off when they really run in parallel: each one decodes
+    # the GIF from its first frame again
+    split = executor.kind == "process" and executor.max_workers > 1
+    plan = await executor.run(plan_job, data, job, size_limit, split)
+    if isinstance(plan, RenderedMedia):
+        return plan
+
+    chunk_size = config.MEDIA_GIF_CHUNK_SIZE * plan.stride
+    semaphore = asyncio.Semaphore(config.MEDIA_MAX_WORKERS_PER_JOB)
+
+    async def run_chunk(start: int) -> bytes:
+        async with semaphore:
+            return await executor.run(
+                render_chunk, data, job, plan.palette,
+                start, min(start + chunk_size, plan.n_frames)
+            )
+
+    chunks = await asyncio.gather(
+        *(run_chunk(start) for start in range(0, plan.n_frames, chunk_size))
+    )
+    return RenderedMedia(plan.header + b''.join(chunks) + GIF_TRAILER, 'GIF')
+
+
+async def render_media(
+        executor: RenderExecutor,
+        data: bytes,
+        job: RenderJob,
+        size_limit: Optional[int] = None) -> RenderedMedia:
+    """
+    Render `job` on `data` in the executor, small enough to be uploaded.
+
+    With more than one process worker, GIFs longer than
+    `MEDIA_GIF_CHUNK_SIZE` frames are split into chunks that render in
+    parallel, at most `MEDIA_MAX_WORKERS_PER_JOB` at a time so one
+    huge GIF cannot take over the whole pool. The encoded chunks are then
+    joined in frame order. Chunks hold `MEDIA_GIF_CHUNK_SIZE` output frames,
+    so they span more source frames when the pixel budget drops some.
+
+    Stills pick their format and quality in the worker. Animations over
+    `size_limit` are re-encoded as animated WebP, then rendered again with
+    the fewer colours and smaller scales of `MEDIA_ANIMATION_STEPS` until one
+    fits. If nothing fits, the smallest output is returned.
+    """
+    started = time.perf_counter()
+    best: Optional[RenderedMedia] = None
+    attempts = 0
+
+    for step, (scale, colors) in enumerate(config.MEDIA_ANIMATION_STEPS):
+        result = await _render_once(
+            executor, data, replace(job, scale=scale, colors=colors), size_limit
+        )
+        attempts += result.attempts
+        candidates = [result]
+
+        if result.format == 'GIF' and size_limit is not None and len(result.data) > size_limit:
+            qualities = config.MEDIA_WEBP_QUALITIES
+            webp = await executor.run(gif_to_webp, result.data, qualities[min(step, len(qualities) - 1)])
+            attempts += 1
+            candidates.append(RenderedMedia(webp, 'WEBP'))
+
+        for candidate in candidates:
+            if best is None or len(candidate.data) < len(best.data):
+                best = candidate
+
+        # Stills already went through their own attempts
+        if result.format != 'GIF' or size_limit is None or len(best.data) <= size_limit:
+            break
+
+    best.attempts = attempts
+    best.elapsed = time.perf_counter() - started
+    return best
+
+
+def render_video_overlay(
+        job: RenderJob,
+        width: int,
+        height: int) -> Tuple[bytes, Tuple[int, int], Tuple[int, int]]:
+    """
+    Render the overlay of `job` for a `width` x `height` video, as a PNG.
+
+    Return
+    -------
+    The PNG, the size of the output canvas and the position of the video on it
+    """
+    overlay, (x, y) = VIDEO_OVERLAYS[job.command](width, height, *job.texts)
+
+    # H.264 wants even sides, grow odd canvases by a row or column in front
+    dx, dy = overlay.width % 2, overlay.height % 2
+    if dx or dy:
+        canvas = Image.new('RGBA', (overlay.width + dx, overlay.height + dy), (0, 0, 0, 0))
+        canvas.paste(overlay, (dx, dy))
+        overlay, x, y = canvas, x + dx, y + dy
+
+    with BytesIO() as output:
+        overlay.save(output, format='PNG', compress_level=1)
+        return output.getvalue(), overlay.size, (x, y)
+
+
+async def render_video(
+        executor: RenderExecutor,
+        data: bytes,
+        job: RenderJob,
+        size_limit: Optional[int] = None) -> RenderedMedia:
+    """
+    Render `job` on a video.
+
+    Only the overlay is drawn in the executor, once. ffmpeg scales the video
+    within `MEDIA_VIDEO_MAX_DIMENSION`, composites the overlay on every frame
+    and encodes an MP4 of at most `MEDIA_VIDEO_MAX_SECONDS` and `size_limit`
+    bytes.
+    """
+    started = time.perf_counter()
+    async with video_file(data) as path:
+        info = await probe_video(path)
+        size = fit_video(info.width, info.height)
+        overlay, canvas, position = await executor.run(render_video_overlay, job, *size)
+        output = await overlay_video(
+            path, overlay, size, canvas, position,
+            duration=info.duration, size_limit=size_limit
+        )
+    return RenderedMedia(output, 'MP4', elapsed=time.perf_counter() - started)
@@ -0,0 +1,49 @@
+from functools import partial
+from typing import Callable, Optional, Tuple
+from PIL import Image as PImg
+import config
+from utils.image_text import ImageText
+
+
+def render_overlay(
+        width: int,
+        height: int,
+        top_text: Optional[str] = None,
+        bottom_text: Optional[str] = None) -> PImg.Image:
+    """Render top and bottom text once into a transparent `width` x `height` layer."""
+    margin = min(width, height) // 30
+    overlay = ImageText((width, height))
+
+    if top_text:
+        overlay.write_text_box((margin, margin), top_text, width - 2 * margin,
+                               config.IMPACT_FONT, place='center', stroke=True)
+
+    if bottom_text:
+        overlay.write_text_box((margin, margin), bottom_text, width - 2 * margin,
+                               config.IMPACT_FONT, place='center', position='bottom', stroke=True)
+
+    return overlay.image
+
+
+def apply_overlay(frame: PImg.Image, overlay: PImg.Image) -> PImg.Image:
+    """Composite a rendered text layer onto a frame."""
+    return PImg.alpha_composite(frame.convert('RGBA'), overlay)
+
+
+def compositor(
+        width: int,
+        height: int,
+        top_text: Optional[str] = None,
+        bottom_text: Optional[str] = None) -> Callable[[PImg.Image], PImg.Image]:
+    """Get the function that turns a source frame into an output frame."""
+    overlay = render_overlay(width, height, top_text, bottom_text)
+    return partial(apply_overlay, overlay=overlay)
+
+
+def video_overlay(
+        width: int,
+        height: int,
+        top_text: Optional[str] = None,
+        bottom_text: Optional[str] = None) -> Tuple[PImg.Image, Tuple[int, int]]:
+    """Get the layer ffmpeg composites over a `width` x `height` video, and where the video goes."""
+    return render_overlay(width, height, top_text, bottom_text), (0, 0)
@@ -0,0 +1,5 @@
+import os
+
+# config requires these, the tests never reach Discord
+os.environ.setdefault("TOKEN", "test")
+os.environ.setdefault("OWNER", "0")
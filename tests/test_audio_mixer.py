@@ -0,0 +1,102 @@
+"""AudioMixer with sources that end, stop and block."""
+
+import threading
+import time
+import unittest
+
+import discord
+from discord.opus import Encoder
+import numpy as np
+
+from utils.audio_mixer import AudioMixer
+
+
+class Tone(discord.AudioSource):
+    """`frames` frames of a constant sample value."""
+
+    def __init__(self, value: int, frames: int) -> None:
+        self.frame = np.full(Encoder.FRAME_SIZE // 2, value, dtype=np.int16).tobytes()
+        self.frames = frames
+        self.cleaned_up = False
+
+    def read(self) -> bytes:
+        if not self.frames:
+            return b''
+        self.frames -= 1
+        return self.frame
+
+    def cleanup(self) -> None:
+        self.cleaned_up = True
+
+
+class Stalled(Tone):
+    """A tone whose reads wait for `go`, like a stream waiting for ffmpeg."""
+
+    def __init__(self, value: int, frames: int) -> None:
+        super().__init__(value, frames)
+        self.reading = threading.Event()
+        self.go = threading.Event()
+
+    def read(self) -> bytes:
+        self.reading.set()
+        self.go.wait(5)
+        return super().read()
+
+
+def samples(frame: bytes) -> np.ndarray:
+    return np.frombuffer(frame, dtype=np.int16)
+
+
+class AudioMixerTest(unittest.TestCase):
+    def test_sums_and_saturates(self) -> None:
+        mixer = AudioMixer()
+        mixer.add(Tone(1000, 2))
+        mixer.add(Tone(2000, 1))
+        self.assertTrue((samples(mixer.read()) == 3000).all())
+        self.assertTrue((samples(mixer.read()) == 1000).all())
+
+        mixer.add(Tone(30000, 1))
+        mixer.add(Tone(30000, 1))
+        self.assertTrue((samples(mixer.read()) == 32767).all())
+
+    def test_ends_with_its_tracks(self) -> None:
+        mixer = AudioMixer()
+        source = Tone(1000, 1)
+        mixer.add(source)
+        self.assertEqual(len(mixer.read()), Encoder.FRAME_SIZE)
+        # The track ends, then the mixer
+        self.assertTrue((samples(mixer.read()) == 0).all())
+        self.assertTrue(source.cleaned_up)
+        self.assertEqual(mixer.read(), b'')
+        with self.assertRaises(RuntimeError):
+            mixer.add(Tone(1000, 1))
+
+    def test_gain_and_stop(self) -> None:
+        mixer = AudioMixer(keep_alive=True)
+        track = mixer.add(Tone(1000, 10), gain=0.5)
+        self.assertTrue((samples(mixer.read()) == 500).all())
+        mixer.remove(track)
+        self.assertTrue((samples(mixer.read()) == 0).all())
+        self.assertTrue(track.source.cleaned_up)
+        self.assertEqual(len(mixer.read()), Encoder.FRAME_SIZE)
+
+    def test_add_does_not_wait_for_a_blocked_read(self) -> None:
+        mixer = AudioMixer()
+        stalled = Stalled(1000, 1)
+        mixer.add(stalled)
+        reader = threading.Thread(target=mixer.read)
+        reader.start()
+        self.assertTrue(stalled.reading.wait(5))
+
+        started = time.monotonic()
+        track = mixer.add(Tone(2000, 1))
+        mixer.remove(track)
+        self.assertLess(time.monotonic() - started, 1)
+
+        stalled.go.set()
+        reader.join(5)
+        self.assertFalse(reader.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""Downloader against a local stand-in for the Discord CDN."""
+
+import asyncio
+import tempfile
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.downloader import Downloader, DownloadTooLarge
+from utils.render_cache import RenderCache
+
+FILE = bytes(range(256)) * 1024  # 256 KiB
+VARIANT = FILE[:1024]
+
+
+class DownloaderTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.hits = {}
+        app = web.Application()
+        app.router.add_get("/file", self.file)
+        app.router.add_get("/variant", self.variant)
+        app.router.add_get("/small", self.small)
+        app.router.add_get("/chunked", self.chunked)
+        app.router.add_get("/stall", self.stall)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.session = aiohttp.ClientSession()
+
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(self.cache_dir.name, memory_bytes=0, disk_bytes=10 * len(FILE), ttl=60)
+        self.downloader = Downloader(
+            max_bytes=len(FILE),
+            timeout=aiohttp.ClientTimeout(total=5, sock_read=0.2),
+            cache=self.cache,
+        )
+
+    async def asyncTearDown(self) -> None:
+        await self.session.close()
+        await self.server.close()
+        self.cache_dir.cleanup()
+
+    def _hit(self, request: web.Request) -> None:
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+
+    async def file(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        return web.Response(body=FILE)
+
+    async def variant(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        return web.Response(body=VARIANT)
+
+    async def small(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        return web.Response(body=FILE[:512])
+
+    async def chunked(self, request: web.Request) -> web.StreamResponse:
+        """FILE without a Content-Length, twice over if `?twice` is set."""
+        self._hit(request)
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        for _ in range(2 if "twice" in request.query else 1):
+            for start in range(0, len(FILE), 16 * 1024):
+                await response.write(FILE[start:start + 16 * 1024])
+        await response.write_eof()
+        return response
+
+    async def stall(self, request: web.Request) -> web.StreamResponse:
+        """Send a first chunk, then nothing."""
+        self._hit(request)
+        response = web.StreamResponse()
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        await response.write(FILE[:1024])
+        await asyncio.sleep(5)
+        return response
+
+    async def test_fetch(self) -> None:
+        data = await self.downloader.fetch(self.session, str(self.server.make_url("/chunked")))
+        self.assertEqual(data, FILE)
+        self.assertEqual(self.downloader.bytes_downloaded, len(FILE))
+
+    async def test_byte_cap(self) -> None:
+        with self.assertRaises(DownloadTooLarge) as raised:
+            await self.downloader.fetch(self.session, str(self.server.make_url("/chunked?twice")))
+        self.assertEqual(raised.exception.max_bytes, len(FILE))
+        self.assertEqual(self.downloader.bytes_downloaded, 0)
+
+    async def test_declared_size_abort(self) -> None:
+        # Announced by the server
+        with self.assertRaises(DownloadTooLarge):
+            await self.downloader.fetch(self.session, str(self.server.make_url("/file")), declared_size=1024)
+        # Found out while streaming
+        with self.assertRaises(DownloadTooLarge) as raised:
+            await self.downloader.fetch(self.session, str(self.server.make_url("/chunked")), declared_size=1024)
+        self.assertEqual(raised.exception.max_bytes, 1024)
+        # Over the cap before any request
+        with self.assertRaises(DownloadTooLarge):
+            await self.downloader.fetch(self.session, str(self.server.make_url("/file")), declared_size=len(FILE) + 1)
+        self.assertEqual(self.hits.get("/file"), 1)
+
+    async def test_read_timeout(self) -> None:
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.downloader.fetch(self.session, str(self.server.make_url("/stall")))
+
+    async def test_not_found(self) -> None:
+        self.assertIsNone(await self.downloader.fetch(self.session, str(self.server.make_url("/missing"))))
+
+    async def test_cache_hit(self) -> None:
+        url = str(self.server.make_url("/file"))
+        self.assertEqual(await self.downloader.fetch(self.session, url, key=1), FILE)
+        self.assertEqual(await self.downloader.fetch(self.session, url, key=1), FILE)
+        self.assertEqual(self.hits["/file"], 1)
+        self.assertEqual(self.downloader.bytes_downloaded, len(FILE))
+
+    async def test_no_cache(self) -> None:
+        downloader = Downloader(max_bytes=len(FILE))
+        url = str(self.server.make_url("/file"))
+        self.assertEqual(await downloader.fetch(self.session, url, key=1), FILE)
+        self.assertEqual(await downloader.fetch(self.session, url, key=1), FILE)
+        self.assertEqual(self.hits["/file"], 2)
+
+    async def test_fetch_variant(self) -> None:
+        data = await self.downloader.fetch_variant(
+            self.session, str(self.server.make_url("/variant")), str(self.server.make_url("/file")),
+            key=1, declared_size=len(FILE)
+        )
+        self.assertEqual(data, VARIANT)
+        self.assertNotIn("/file", self.hits)
+        self.assertEqual(self.downloader.bytes_saved, len(FILE) - len(VARIANT))
+
+        # Served from the cache, saving nothing more
+        await self.downloader.fetch_variant(
+            self.session, str(self.server.make_url("/variant")), str(self.server.make_url("/file")),
+            key=1, declared_size=len(FILE)
+        )
+        self.assertEqual(self.hits["/variant"], 1)
+        self.assertEqual(self.downloader.bytes_saved, len(FILE) - len(VARIANT))
+
+    async def test_fetch_variant_fallback(self) -> None:
+        for variant in ("/missing", "/stall"):
+            data = await self.downloader.fetch_variant(
+                self.session, str(self.server.make_url(variant)), str(self.server.make_url("/file")),
+                declared_size=len(FILE)
+            )
+            self.assertEqual(data, FILE)
+        self.assertEqual(self.hits["/file"], 2)
+        self.assertEqual(self.downloader.bytes_saved, 0)
+
+    async def test_fetch_variant_bigger_than_original(self) -> None:
+        # Resizing a small, well compressed file can make it bigger
+        data = await self.downloader.fetch_variant(
+            self.session, str(self.server.make_url("/variant")), str(self.server.make_url("/small")),
+            declared_size=512
+        )
+        self.assertEqual(data, VARIANT)
+        self.assertNotIn("/small", self.hits)
+        self.assertEqual(self.downloader.bytes_saved, 0)
+
+    async def test_fetch_variant_over_cap(self) -> None:
+        data = await self.downloader.fetch_variant(
+            self.session, str(self.server.make_url("/chunked?twice")), str(self.server.make_url("/small")),
+            declared_size=512
+        )
+        self.assertEqual(data, FILE[:512])
+
+
+if __name__ == "__main__":
+    unittest.main()
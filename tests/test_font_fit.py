@@ -0,0 +1,80 @@
+"""Font sizing and word-wrap layout."""
+
+import unittest
+
+import config
+from utils.font_cache import get_font
+from utils.font_fit import MIN_FONT_SIZE, fit_font_size
+from utils.text_layout import layout_text
+
+FONT = config.IMPACT_FONT
+
+
+class LayoutTextTest(unittest.TestCase):
+    def test_wraps_within_box(self) -> None:
+        layout = layout_text("the quick brown fox jumps over the lazy dog", FONT, 40, 300)
+        self.assertGreater(len(layout.lines), 1)
+        self.assertLessEqual(layout.width, 300)
+        self.assertEqual(" ".join(layout.lines), "the quick brown fox jumps over the lazy dog")
+
+    def test_long_word_gets_own_line(self) -> None:
+        layout = layout_text("a supercalifragilisticexpialidocious b", FONT, 40, 100)
+        self.assertEqual(layout.lines, ("a", "supercalifragilisticexpialidocious", "b"))
+        self.assertGreater(layout.widths[1], 100)
+
+    def test_empty(self) -> None:
+        layout = layout_text("   ", FONT, 40, 100)
+        self.assertEqual(layout.lines, ())
+        self.assertEqual(layout.total_height, 0)
+
+    def test_cached(self) -> None:
+        first = layout_text("cached layout", FONT, 30, 200)
+        hits = layout_text.cache_info().hits
+        self.assertIs(layout_text("cached layout", FONT, 30, 200), first)
+        self.assertEqual(layout_text.cache_info().hits, hits + 1)
+
+
+class FitFontSizeTest(unittest.TestCase):
+    def test_single_line_fits_box(self) -> None:
+        size = fit_font_size("Hello there", FONT, 200, max_height=60)
+        bbox = get_font(str(FONT), size).getbbox("Hello there")
+        self.assertLessEqual(bbox[2] - bbox[0], 200)
+        self.assertLessEqual(bbox[3] - bbox[1], 60)
+
+        # One size up no longer fits
+        bbox = get_font(str(FONT), size + 1).getbbox("Hello there")
+        self.assertTrue(bbox[2] - bbox[0] > 200 or bbox[3] - bbox[1] > 60)
+
+    def test_size_bounds(self) -> None:
+        self.assertEqual(fit_font_size("hi", FONT, 10000, max_height=10000, max_size=50), 50)
+        self.assertEqual(fit_font_size("far too much text", FONT, 1, max_height=1), MIN_FONT_SIZE)
+
+    def test_band_height(self) -> None:
+        text = "when the code works on the first try"
+        size = fit_font_size(text, FONT, 400, 500)
+        layout = layout_text(text, FONT, size, 400)
+        self.assertGreaterEqual(layout.total_height, 0.1 * 500)
+        self.assertLessEqual(layout.total_height, (0.2 + 0.02 * len(layout.lines)) * 500)
+        self.assertLessEqual(layout.width, 400)
+
+    def test_long_word_shrinks_to_box(self) -> None:
+        text = "supercalifragilisticexpialidocious"
+        size = fit_font_size(text, FONT, 150, 500)
+        self.assertLessEqual(layout_text(text, FONT, size, 150).width, 150)
+        self.assertGreater(layout_text(text, FONT, size + 1, 150).width, 150)
+
+    def test_requires_a_bound(self) -> None:
+        with self.assertRaises(ValueError):
+            fit_font_size("text", FONT)
+        with self.assertRaises(ValueError):
+            fit_font_size("text", FONT, img_height=100)
+
+    def test_cached(self) -> None:
+        size = fit_font_size("cached caption", FONT, 300, 400)
+        hits = fit_font_size.cache_info().hits
+        self.assertEqual(fit_font_size("cached caption", FONT, 300, 400), size)
+        self.assertEqual(fit_font_size.cache_info().hits, hits + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+"""GIF writer round trips through Pillow's decoder."""
+
+from io import BytesIO
+import unittest
+
+from PIL import Image, ImageSequence
+
+from utils.gif_encoder import GIF_TRAILER, GifWriter, build_palette, gif_header
+
+SIZE = (32, 32)
+RED = (255, 0, 0, 255)
+BLUE = (0, 0, 255, 255)
+GREEN = (0, 255, 0, 255)
+
+
+def _frame(color, box=None, fill=(0, 0, 0, 0)):
+    """A `fill` frame with `box` in `color`, or all of it without a box."""
+    frame = Image.new('RGBA', SIZE, fill if box else color)
+    if box:
+        frame.paste(color, box)
+    return frame
+
+
+def _encode(frames, palette=True):
+    """Encode `frames` with GifWriter and decode them back as RGBA."""
+    shared = build_palette(frames) if palette else None
+    output = BytesIO()
+    writer = GifWriter(output, shared)
+    for frame in frames:
+        writer.write(frame, 100)
+    writer.close()
+
+    first = Image.new('P', SIZE)
+    first.putpalette((shared or frames[0].convert('RGB').quantize()).getpalette())
+    data = gif_header(first) + output.getvalue() + GIF_TRAILER
+    return [frame.convert('RGBA') for frame in ImageSequence.Iterator(Image.open(BytesIO(data)))]
+
+
+class GifWriterTest(unittest.TestCase):
+    def test_opaque_deltas(self) -> None:
+        frames = [_frame(RED), _frame(BLUE, (8, 8, 16, 16), fill=RED)]
+        decoded = _encode(frames)
+        self.assertEqual(len(decoded), 2)
+        self.assertEqual(decoded[1].getpixel((0, 0)), RED)
+        self.assertEqual(decoded[1].getpixel((10, 10)), BLUE)
+
+    def test_opaque_then_transparent(self) -> None:
+        frames = [
+            # Pillow only decodes later frames with alpha if the first has some
+            _frame(GREEN, (16, 0, 32, 32)),
+            _frame(RED),
+            # Stored as a delta of the previous frame
+            _frame(BLUE, (8, 8, 16, 16), fill=RED),
+            # Clear on its left half
+            _frame(GREEN, (16, 0, 32, 32)),
+        ]
+        for palette in (True, False):
+            with self.subTest(palette=palette):
+                decoded = _encode(frames, palette)
+                self.assertEqual(len(decoded), 4)
+                self.assertEqual(decoded[2].getpixel((10, 10)), BLUE)
+                self.assertEqual(decoded[3].getpixel((0, 0))[3], 0)
+                self.assertEqual(decoded[3].getpixel((10, 10))[3], 0)
+                self.assertEqual(decoded[3].getpixel((20, 20)), GREEN)
+
+    def test_transparent_then_opaque(self) -> None:
+        frames = [_frame(GREEN, (16, 0, 32, 32)), _frame(RED), _frame(BLUE, (8, 8, 16, 16), fill=RED)]
+        decoded = _encode(frames)
+        self.assertEqual(decoded[1].getpixel((0, 0)), RED)
+        self.assertEqual(decoded[2].getpixel((10, 10)), BLUE)
+        self.assertEqual(decoded[2].getpixel((0, 0)), RED)
+
+
+if __name__ == "__main__":
+    unittest.main()
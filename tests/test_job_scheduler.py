@@ -0,0 +1,141 @@
+"""Fair job scheduling and queue positions."""
+
+import asyncio
+import unittest
+
+from utils.job_scheduler import FairScheduler, PositionBroadcast, QueueFull
+
+
+class FairSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def _job(self, scheduler, owner, name, started, release, on_position=None):
+        async with scheduler.slot(owner, on_position):
+            started.append(name)
+            await release.wait()
+
+    async def test_round_robin(self) -> None:
+        scheduler = FairScheduler(max_running=1, max_per_owner=1, max_queued=10, update_interval=0)
+        started = []
+        releases = {}
+
+        # A busy guild queues three jobs before another guild queues two
+        jobs = [("a", 1), ("a", 2), ("a", 3), ("b", 1), ("b", 2)]
+        tasks = []
+        for owner, number in jobs:
+            name = f"{owner}{number}"
+            releases[name] = asyncio.Event()
+            tasks.append(asyncio.create_task(self._job(scheduler, owner, name, started, releases[name])))
+            await asyncio.sleep(0)
+
+        for _ in jobs:
+            await asyncio.sleep(0)
+            releases[started[-1]].set()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+        # a2 was queued first, then the guilds take turns
+        self.assertEqual(started, ["a1", "a2", "b1", "a3", "b2"])
+        self.assertEqual(scheduler.completed, 5)
+
+    async def test_slot_limits(self) -> None:
+        scheduler = FairScheduler(max_running=3, max_per_owner=2, max_queued=10, update_interval=0)
+        started = []
+        release = asyncio.Event()
+
+        tasks = [
+            asyncio.create_task(self._job(scheduler, owner, f"{owner}{number}", started, release))
+            for owner, number in [("a", 1), ("a", 2), ("a", 3), ("b", 1), ("b", 2)]
+        ]
+        await asyncio.sleep(0)
+
+        # Two for the busy guild, and the last slot for the other one
+        self.assertEqual(sorted(started), ["a1", "a2", "b1"])
+        self.assertEqual(scheduler.running, 3)
+        self.assertEqual(scheduler.queued, 2)
+
+        release.set()
+        await asyncio.gather(*tasks)
+        self.assertEqual(scheduler.running, 0)
+        self.assertEqual(scheduler.queued, 0)
+
+    async def test_queue_full(self) -> None:
+        scheduler = FairScheduler(max_running=1, max_per_owner=1, max_queued=1, update_interval=0)
+        started = []
+        release = asyncio.Event()
+
+        running = asyncio.create_task(self._job(scheduler, "a", "a1", started, release))
+        queued = asyncio.create_task(self._job(scheduler, "b", "b1", started, release))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(QueueFull):
+            async with scheduler.slot("c"):
+                pass
+        self.assertEqual(scheduler.rejected, 1)
+
+        release.set()
+        await asyncio.gather(running, queued)
+
+    async def test_cancelled_while_queued(self) -> None:
+        scheduler = FairScheduler(max_running=1, max_per_owner=1, max_queued=10, update_interval=0)
+        started = []
+        release = asyncio.Event()
+
+        running = asyncio.create_task(self._job(scheduler, "a", "a1", started, release))
+        queued = asyncio.create_task(self._job(scheduler, "b", "b1", started, release))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        self.assertEqual(scheduler.queued, 0)
+
+        release.set()
+        await running
+        self.assertEqual(started, ["a1"])
+        self.assertEqual(scheduler.running, 0)
+
+    async def test_positions(self) -> None:
+        scheduler = FairScheduler(max_running=1, max_per_owner=1, max_queued=10, update_interval=0)
+        started = []
+        release = asyncio.Event()
+        positions = []
+
+        async def on_position(position: int) -> None:
+            positions.append(position)
+
+        tasks = [
+            asyncio.create_task(self._job(scheduler, "a", "a1", started, release)),
+            asyncio.create_task(self._job(scheduler, "b", "b1", started, release)),
+            asyncio.create_task(self._job(scheduler, "c", "c1", started, release, on_position)),
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        await asyncio.sleep(0)
+
+        self.assertEqual(positions, [2, 1, 0])
+
+
+class PositionBroadcastTest(unittest.IsolatedAsyncioTestCase):
+    async def test_fans_out(self) -> None:
+        broadcast = PositionBroadcast()
+        first, second = [], []
+
+        async def on_first(position: int) -> None:
+            first.append(position)
+
+        async def on_second(position: int) -> None:
+            second.append(position)
+
+        await broadcast.add(on_first)
+        await broadcast(3)
+        # Joining late still shows where the job is
+        await broadcast.add(on_second)
+        await broadcast(2)
+        broadcast.remove(on_first)
+        await broadcast(0)
+
+        self.assertEqual(first, [3, 2])
+        self.assertEqual(second, [3, 2, 0])
+        self.assertEqual(len(broadcast), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""De-duplication of concurrent jobs."""
+
+import asyncio
+import unittest
+
+from utils.single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_deduplicates(self) -> None:
+        flight = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def job() -> str:
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "done"
+
+        waiters = [asyncio.create_task(flight.run("key", job)) for _ in range(5)]
+        await asyncio.sleep(0)
+        self.assertEqual(len(flight), 1)
+
+        release.set()
+        self.assertEqual(await asyncio.gather(*waiters), ["done"] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual((flight.started, flight.shared), (1, 4))
+        self.assertEqual(len(flight), 0)
+
+    async def test_not_cached(self) -> None:
+        flight = SingleFlight()
+        calls = 0
+
+        async def job() -> int:
+            nonlocal calls
+            calls += 1
+            return calls
+
+        self.assertEqual(await flight.run("key", job), 1)
+        self.assertEqual(await flight.run("key", job), 2)
+
+    async def test_keys_run_separately(self) -> None:
+        flight = SingleFlight()
+
+        async def job(value: str) -> str:
+            await asyncio.sleep(0)
+            return value
+
+        results = await asyncio.gather(
+            flight.run("a", lambda: job("a")),
+            flight.run("b", lambda: job("b")),
+        )
+        self.assertEqual(results, ["a", "b"])
+        self.assertEqual(flight.started, 2)
+
+    async def test_error_reaches_every_waiter(self) -> None:
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def job() -> None:
+            await release.wait()
+            raise ValueError("broken")
+
+        waiters = [asyncio.create_task(flight.run("key", job)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        self.assertEqual(len(results), 3)
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+        self.assertEqual(len(flight), 0)
+
+    async def test_cancelled_waiter_keeps_job(self) -> None:
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def job() -> str:
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.run("key", job))
+        second = asyncio.create_task(flight.run("key", job))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+
+        release.set()
+        self.assertEqual(await second, "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+"""The lazy re-exports of the utils package."""
+
+from importlib import import_module
+import unittest
+
+import utils
+
+
+class ExportsTest(unittest.TestCase):
+    def test_every_module_name_is_exported(self) -> None:
+        for module_name in set(utils._EXPORTS.values()):
+            module = import_module(f"utils.{module_name}")
+            for name in module.__all__:
+                if name == module_name:
+                    continue
+                with self.subTest(module=module_name, name=name):
+                    self.assertEqual(utils._EXPORTS.get(name), module_name)
+
+    def test_exports_resolve(self) -> None:
+        for name, module_name in utils._EXPORTS.items():
+            with self.subTest(name=name):
+                self.assertIs(getattr(utils, name), getattr(import_module(f"utils.{module_name}"), name))
+
+    def test_unknown_name(self) -> None:
+        with self.assertRaises(AttributeError):
+            utils.not_a_helper
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,130 @@
-from .pagination import *
-from .message_utils import *
-from .get_attachment import *
-from .image_text import *
-from .ffmpeg_audio import *
-from .timeout import *
+"""
+Shared helpers, re-exported from their modules.
+
+A module is only imported once one of its names is used, so render
+workers importing a media module do not load discord through the
+Discord helpers. Importing from the modules directly works the same.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .pagination import *
+    from .message_utils import *
+    from .get_attachment import *
+    from .font_cache import *
+    from .text_layout import *
+    from .glyph_atlas import *
+    from .font_fit import *
+    from .image_text import *
+    from .ffmpeg_audio import *
+    from .ffmpeg_video import *
+    from .clip_cache import *
+    from .audio_mixer import *
+    from .audio_volume import *
+    from .timeout import *
+    from .render_executor import *
+    from .media_decode import *
+    from .gif_encoder import *
+    from .media_output import *
+    from .render_cache import *
+    from .single_flight import *
+    from .downloader import *
+    from .job_scheduler import *
+
+# Exported name -> module defining it. Functions named like their module
+# (get_attachment, ffmpeg_audio) are left out: once the module is imported,
+# the package attribute is the module. Import them from the module.
+_EXPORTS = {
+    "PaginationSource": "pagination",
+    "EmbedPaginationSource": "pagination",
+    "PaginationView": "pagination",
+    "paginate": "pagination",
+    "MessageDestination": "message_utils",
+    "ErrorHandler": "message_utils",
+    "safe_send": "message_utils",
+    "safe_reply": "message_utils",
+    "send": "message_utils",
+    "reply": "message_utils",
+    "get_referenced_message": "get_attachment",
+    "find_attachment": "get_attachment",
+    "get_attachments": "get_attachment",
+    "resized_proxy_url": "get_attachment",
+    "FontRegistry": "font_cache",
+    "font_registry": "font_cache",
+    "get_font": "font_cache",
+    "Layout": "text_layout",
+    "layout_text": "text_layout",
+    "Glyph": "glyph_atlas",
+    "get_glyph": "glyph_atlas",
+    "draw_text_line": "glyph_atlas",
+    "fit_font_size": "font_fit",
+    "ImageText": "image_text",
+    "FFmpegPCMAudio": "ffmpeg_audio",
+    "VideoError": "ffmpeg_video",
+    "VideoInfo": "ffmpeg_video",
+    "video_file": "ffmpeg_video",
+    "probe_video": "ffmpeg_video",
+    "fit_video": "ffmpeg_video",
+    "overlay_video": "ffmpeg_video",
+    "ClipError": "clip_cache",
+    "PCMClip": "clip_cache",
+    "PCMClipSource": "clip_cache",
+    "ClipCache": "clip_cache",
+    "MixerTrack": "audio_mixer",
+    "AudioMixer": "audio_mixer",
+    "PCMVolume": "audio_volume",
+    "LoudnessNormalizer": "audio_volume",
+    "loudness": "audio_volume",
+    "integrated_loudness": "audio_volume",
+    "loudness_gain": "audio_volume",
+    "TimeoutView": "timeout",
+    "RenderExecutor": "render_executor",
+    "warm_up_worker": "render_executor",
+    "DecodePlan": "media_decode",
+    "plan_decode": "media_decode",
+    "open_media": "media_decode",
+    "scale_frame": "media_decode",
+    "TRANSPARENT_INDEX": "gif_encoder",
+    "build_palette": "gif_encoder",
+    "quantize_frame": "gif_encoder",
+    "frame_timing": "gif_encoder",
+    "GIF_TRAILER": "gif_encoder",
+    "gif_header": "gif_encoder",
+    "GifWriter": "gif_encoder",
+    "plan_animation": "gif_encoder",
+    "encode_frames": "gif_encoder",
+    "encode_animation": "gif_encoder",
+    "EncodedMedia": "media_output",
+    "EXTENSIONS": "media_output",
+    "encode_still": "media_output",
+    "negotiate_still": "media_output",
+    "gif_to_webp": "media_output",
+    "CacheStats": "render_cache",
+    "RenderCache": "render_cache",
+    "render_cache_key": "render_cache",
+    "normalize_text": "render_cache",
+    "SingleFlight": "single_flight",
+    "DownloadTooLarge": "downloader",
+    "Downloader": "downloader",
+    "PositionCallback": "job_scheduler",
+    "PositionBroadcast": "job_scheduler",
+    "QueueFull": "job_scheduler",
+    "FairScheduler": "job_scheduler",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f"{__name__}.{module_name}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted([*globals(), *_EXPORTS])
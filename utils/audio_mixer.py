@@ -0,0 +1,187 @@
+"""Mix several PCM audio sources into one, so clips can play over each other."""
+
+from __future__ import annotations
+from threading import Lock
+from typing import List, Optional
+
+import discord
+from discord.opus import Encoder
+import numpy as np
+
+import config
+from logger import logger
+
+__all__ = [
+    "MixerTrack",
+    "AudioMixer",
+]
+
+SAMPLES_PER_FRAME = Encoder.SAMPLES_PER_FRAME * Encoder.CHANNELS
+
+
+def _frames(seconds: float) -> int:
+    return max(0, round(seconds * 1000 / Encoder.FRAME_LENGTH))
+
+
+class MixerTrack:
+    """
+    A source playing in an `AudioMixer`, with its gain and fades.
+
+    `gain` can be changed while the track plays; fades are applied on top of
+    it, linearly within each frame so they do not click.
+    """
+
+    def __init__(self, source: discord.AudioSource, gain: float = 1.0, fade_in: float = 0.0) -> None:
+        if source.is_opus():
+            raise ValueError("Opus sources cannot be mixed, use a PCM source")
+        self.source = source
+        self.gain = gain
+        fade_frames = _frames(fade_in)
+        self._fade = 0.0 if fade_frames else 1.0
+        self._fade_step = 1.0 / fade_frames if fade_frames else 0.0
+        self.stopping = False
+        self.finished = False
+
+    def stop(self, fade_out: float = 0.0) -> None:
+        """Stop the track, after fading out for `fade_out` seconds."""
+        fade_frames = _frames(fade_out)
+        self.stopping = True
+        if not fade_frames:
+            self.finished = True
+        else:
+            self._fade_step = -self._fade / fade_frames
+
+    def _envelope(self) -> tuple[float, float]:
+        """Gain at the start and the end of the next frame."""
+        start = self._fade
+        self._fade = min(1.0, max(0.0, self._fade + self._fade_step))
+        if self._fade in (0.0, 1.0):
+            self._fade_step = 0.0
+            if self.stopping and self._fade == 0.0:
+                self.finished = True
+        return self.gain * start, self.gain * self._fade
+
+    def read(self) -> Optional[bytes]:
+        """Read the next frame of the source, None once it has ended. Can block."""
+        frame = self.source.read()
+        if len(frame) != Encoder.FRAME_SIZE:
+            return None
+        return frame
+
+    def mix_into(self, mix: np.ndarray, frame: bytes) -> None:
+        """Add a frame of the track to `mix`, int32 samples, with its gain and fades."""
+        samples = np.frombuffer(frame, dtype=np.int16)
+        start, end = self._envelope()
+        if start == end == 1.0:
+            mix += samples
+        elif start == end:
+            mix += (samples * np.float32(start)).astype(np.int32)
+        else:
+            ramp = np.linspace(start, end, Encoder.SAMPLES_PER_FRAME, endpoint=False, dtype=np.float32)
+            mix += (samples * np.repeat(ramp, Encoder.CHANNELS)).astype(np.int32)
+
+
+class AudioMixer(discord.AudioSource):
+    """
+    Audio source summing every PCM source added to it.
+
+    Frames are added as int32 and saturated back to int16, one vectorized
+    pass per track every 20 ms. Tracks can be added and stopped while the
+    mixer plays, without waiting for sources that block on a read; finished
+    tracks are cleaned up and removed. The mixer ends
+    when its last track does, unless `keep_alive` is set, in which case it
+    plays silence until stopped.
+    """
+
+    def __init__(self, keep_alive: bool = False, max_tracks: int = config.AUDIO_MIXER_MAX_TRACKS) -> None:
+        self.keep_alive = keep_alive
+        self.max_tracks = max_tracks
+        self._tracks: List[MixerTrack] = []
+        self._mix = np.zeros(SAMPLES_PER_FRAME, dtype=np.int32)
+        self._lock = Lock()
+        self._closed = False
+
+    @property
+    def tracks(self) -> List[MixerTrack]:
+        with self._lock:
+            return list(self._tracks)
+
+    def add(self, source: discord.AudioSource, gain: float = 1.0, fade_in: float = 0.0) -> MixerTrack:
+        """
+        Start playing `source` over the other tracks.
+
+        If `max_tracks` are already playing, the oldest one fades out.
+
+        Raises
+        -------
+        ValueError
+            If the source is Opus, which cannot be mixed
+        RuntimeError
+            If the mixer has already ended
+        """
+        track = MixerTrack(source, gain, fade_in)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The mixer has ended")
+            playing = [track for track in self._tracks if not track.stopping]
+            if len(playing) >= self.max_tracks:
+                playing[0].stop(config.AUDIO_MIXER_FADE_SECONDS)
+            self._tracks.append(track)
+        return track
+
+    def remove(self, track: MixerTrack, fade_out: float = 0.0) -> None:
+        """Stop a track, after fading out for `fade_out` seconds."""
+        with self._lock:
+            track.stop(fade_out)
+
+    def read(self) -> bytes:
+        with self._lock:
+            if self._closed:
+                return b''
+            tracks = [track for track in self._tracks if not track.finished]
+
+        # Sources can block (ffmpeg streams), they are read without the lock
+        # so that add() and remove() on the event loop never wait for them
+        frames = [(track, track.read()) for track in tracks]
+
+        with self._lock:
+            if self._closed:
+                return b''
+
+            self._mix.fill(0)
+            for track, frame in frames:
+                if frame is None:
+                    track.finished = True
+                elif not track.finished:
+                    track.mix_into(self._mix, frame)
+
+            finished = [track for track in self._tracks if track.finished]
+            if finished:
+                self._tracks = [track for track in self._tracks if not track.finished]
+            ended = not self._tracks and not finished and not self.keep_alive
+            if ended:
+                self._closed = True
+
+        for track in finished:
+            self._cleanup(track)
+        if ended:
+            return b''
+
+        np.clip(self._mix, -32768, 32767, out=self._mix)
+        return self._mix.astype(np.int16).tobytes()
+
+    def _cleanup(self, track: MixerTrack) -> None:
+        try:
+            track.source.cleanup()
+        except Exception as e:
+            logger.warning(f"Could not clean up a mixed audio source: {e}")
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self) -> None:
+        with self._lock:
+            self._closed = True
+            tracks, self._tracks = self._tracks, []
+        for track in tracks:
+            self._cleanup(track)
@@ -0,0 +1,219 @@
+"""Volume and loudness normalization of s16le PCM frames, with NumPy instead of audioop."""
+
+from __future__ import annotations
+from collections import deque
+import math
+from typing import Deque, Generic, TypeVar, Union
+
+import discord
+from discord.opus import Encoder
+import numpy as np
+
+import config
+
+__all__ = [
+    "PCMVolume",
+    "LoudnessNormalizer",
+    "loudness",
+    "integrated_loudness",
+    "loudness_gain",
+]
+
+AT = TypeVar("AT", bound=discord.AudioSource)
+
+FULL_SCALE = 32768.0
+# EBU R128 gating block and its step (75% overlap), in frames
+BLOCK_FRAMES = 400 // Encoder.FRAME_LENGTH
+STEP_FRAMES = 100 // Encoder.FRAME_LENGTH
+ABSOLUTE_GATE = -70.0  # LUFS
+RELATIVE_GATE = -10.0  # LU under the ungated loudness
+# Frames measured at once by `integrated_loudness`, which bounds its memory
+MEASURE_CHUNK_FRAMES = 500
+
+
+def loudness(mean_square: float) -> float:
+    """Loudness of a block from the sum over channels of its mean squares, in LUFS."""
+    return -0.691 + 10 * math.log10(mean_square) if mean_square > 0 else -math.inf
+
+
+def _mean_square(lufs: float) -> float:
+    return 10 ** ((lufs + 0.691) / 10)
+
+
+def _gated_loudness(blocks: np.ndarray) -> float:
+    """Loudness of blocks already over the absolute gate, applying the relative gate."""
+    if not len(blocks):
+        return -math.inf
+    gated = blocks[blocks > _mean_square(loudness(float(blocks.mean())) + RELATIVE_GATE)]
+    return loudness(float(gated.mean())) if len(gated) else loudness(float(blocks.mean()))
+
+
+def _frame_energies(samples: np.ndarray) -> np.ndarray:
+    """Sum over channels of the mean squares of every whole frame of `samples`."""
+    frames = samples.reshape(-1, Encoder.SAMPLES_PER_FRAME * Encoder.CHANNELS).astype(np.float32)
+    frames /= FULL_SCALE
+    return np.einsum('ij,ij->i', frames, frames) / Encoder.SAMPLES_PER_FRAME
+
+
+def integrated_loudness(pcm: Union[bytes, memoryview]) -> float:
+    """
+    Gated integrated loudness of 48 kHz stereo s16le PCM, in LUFS.
+
+    Measured like `LoudnessNormalizer` does, but once over the whole audio,
+    so a clip gets a single gain. Audio shorter than a block is measured as
+    one block. Returns -inf for silence.
+    """
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_samples = Encoder.SAMPLES_PER_FRAME * Encoder.CHANNELS
+    n_frames = len(samples) // frame_samples
+    if not n_frames:
+        return -math.inf
+
+    energies = np.empty(n_frames, dtype=np.float64)
+    for start in range(0, n_frames, MEASURE_CHUNK_FRAMES):
+        end = min(start + MEASURE_CHUNK_FRAMES, n_frames)
+        energies[start:end] = _frame_energies(samples[start * frame_samples:end * frame_samples])
+
+    if n_frames < BLOCK_FRAMES:
+        blocks = energies.mean(keepdims=True)
+    else:
+        sums = np.concatenate(([0.0], np.cumsum(energies)))
+        starts = np.arange(0, n_frames - BLOCK_FRAMES + 1, STEP_FRAMES)
+        blocks = (sums[starts + BLOCK_FRAMES] - sums[starts]) / BLOCK_FRAMES
+    return _gated_loudness(blocks[blocks > _mean_square(ABSOLUTE_GATE)])
+
+
+def loudness_gain(
+    measured: float,
+    target: float = config.AUDIO_LOUDNESS_TARGET,
+    max_gain: float = config.AUDIO_LOUDNESS_MAX_GAIN
+) -> float:
+    """Gain factor bringing audio `measured` LUFS loud to `target`, within `max_gain` dB."""
+    gain_db = min(max(target - measured, -max_gain), max_gain)
+    return 10 ** (gain_db / 20)
+
+
+def _apply_gain(frame: bytes, start: float, end: float) -> bytes:
+    """Scale a frame by a gain going linearly from `start` to `end`, saturating."""
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    if start == end:
+        samples *= start
+    else:
+        ramp = np.linspace(start, end, Encoder.SAMPLES_PER_FRAME, endpoint=False, dtype=np.float32)
+        samples *= np.repeat(ramp, Encoder.CHANNELS)
+    np.clip(samples, -FULL_SCALE, FULL_SCALE - 1, out=samples)
+    return samples.astype(np.int16).tobytes()
+
+
+class PCMVolume(discord.AudioSource, Generic[AT]):
+    """
+    Volume control of a PCM source, like `discord.PCMVolumeTransformer`.
+
+    discord.py's transformer relies on `audioop`, which is gone since
+    Python 3.13. Volume changes ramp over one frame instead of clicking.
+    """
+
+    def __init__(self, original: AT, volume: float = 1.0) -> None:
+        if not isinstance(original, discord.AudioSource):
+            raise TypeError(f'expected AudioSource not {original.__class__.__name__}.')
+        if original.is_opus():
+            raise discord.ClientException('AudioSource must not be Opus encoded.')
+
+        self.original: AT = original
+        self.volume = volume
+        self._applied = self._volume
+
+    @property
+    def volume(self) -> float:
+        """Volume as a fraction (1.0 for 100%), up to 2.0."""
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float) -> None:
+        self._volume = min(max(value, 0.0), 2.0)
+
+    def read(self) -> bytes:
+        frame = self.original.read()
+        if len(frame) != Encoder.FRAME_SIZE:
+            return b''
+        start, self._applied = self._applied, self._volume
+        if start == self._applied == 1.0:
+            return frame
+        return _apply_gain(frame, start, self._applied)
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
+
+
+class LoudnessNormalizer(discord.AudioSource, Generic[AT]):
+    """
+    Bring a PCM source to `target` LUFS, measured as it plays.
+
+    Meant for sources whose end is unknown, e.g. streams: the gain moves
+    while the measure settles. Audio available whole, like soundboard
+    clips, is better measured once with `integrated_loudness` and played
+    with the constant `loudness_gain`.
+
+    Loudness is measured the EBU R128 way on 400 ms blocks every 100 ms,
+    with the absolute (-70 LUFS) and relative (-10 LU) gates, over the last
+    `history` seconds. It is not K-weighted: the plain mean square slightly
+    overrates bass-heavy audio compared to a real R128 meter, which is
+    close enough to even out clips. The gain follows the measure smoothly,
+    within `max_gain` dB up or down, and is applied per frame, saturating.
+    """
+
+    def __init__(
+        self,
+        original: AT,
+        target: float = config.AUDIO_LOUDNESS_TARGET,
+        max_gain: float = config.AUDIO_LOUDNESS_MAX_GAIN,
+        history: float = config.AUDIO_LOUDNESS_HISTORY
+    ) -> None:
+        if original.is_opus():
+            raise discord.ClientException('AudioSource must not be Opus encoded.')
+
+        self.original: AT = original
+        self.target = target
+        self.max_gain = max_gain
+
+        self._frames: Deque[float] = deque(maxlen=BLOCK_FRAMES)
+        self._blocks: Deque[float] = deque(maxlen=max(1, round(history * 1000 / 100)))
+        self._since_block = 0
+        self._gain = 1.0
+        self._target_gain = 1.0
+
+    @property
+    def gain(self) -> float:
+        """Gain currently applied, as a factor."""
+        return self._gain
+
+    def _measure(self, frame: bytes) -> None:
+        self._frames.append(float(_frame_energies(np.frombuffer(frame, dtype=np.int16))[0]))
+
+        self._since_block += 1
+        if len(self._frames) < BLOCK_FRAMES or self._since_block < STEP_FRAMES:
+            return
+        self._since_block = 0
+
+        block = sum(self._frames) / len(self._frames)
+        if loudness(block) > ABSOLUTE_GATE:
+            self._blocks.append(block)
+
+        if not self._blocks:
+            return
+        blocks = np.fromiter(self._blocks, dtype=np.float64, count=len(self._blocks))
+        self._target_gain = loudness_gain(_gated_loudness(blocks), self.target, self.max_gain)
+
+    def read(self) -> bytes:
+        frame = self.original.read()
+        if len(frame) != Encoder.FRAME_SIZE:
+            return b''
+
+        self._measure(frame)
+        start = self._gain
+        # Reach a new target gain over about a block, so it does not pump
+        self._gain += (self._target_gain - self._gain) / BLOCK_FRAMES
+        return _apply_gain(frame, start, self._gain)
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
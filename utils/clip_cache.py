@@ -0,0 +1,241 @@
+"""Soundboard clips, decoded once to PCM on disk and played from memory maps."""
+
+from __future__ import annotations
+from collections import OrderedDict
+from functools import cached_property
+import mmap
+import os
+from pathlib import Path
+import subprocess
+import tempfile
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple, Union
+
+import discord
+from discord.opus import Encoder
+
+import config
+from logger import logger
+from .audio_volume import integrated_loudness
+
+__all__ = [
+    "ClipError",
+    "PCMClip",
+    "PCMClipSource",
+    "ClipCache",
+]
+
+
+class ClipError(Exception):
+    """A clip could not be decoded."""
+
+
+class PCMClip:
+    """
+    A decoded clip: 48 kHz stereo s16le, memory-mapped read-only.
+
+    Every playback of the clip reads the same mapping, so guilds playing it
+    at once share its pages, and they stay in the page cache between plays.
+    """
+
+    def __init__(self, key: str, path: Path) -> None:
+        self.key = key
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._map)
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.data) // Encoder.FRAME_SIZE
+
+    @property
+    def duration(self) -> float:
+        return self.n_frames * Encoder.FRAME_LENGTH / 1000
+
+    @cached_property
+    def loudness(self) -> float:
+        """Gated integrated loudness of the whole clip in LUFS, measured on first use."""
+        return integrated_loudness(self.data)
+
+    def frame(self, index: int) -> memoryview:
+        """Frame `index` of the clip, without copying it."""
+        start = index * Encoder.FRAME_SIZE
+        return self.data[start:start + Encoder.FRAME_SIZE]
+
+    def source(self) -> PCMClipSource:
+        """A new audio source playing the clip from the start."""
+        return PCMClipSource(self)
+
+
+class PCMClipSource(discord.AudioSource):
+    """Plays a `PCMClip`, one frame at a time, without a subprocess."""
+
+    def __init__(self, clip: PCMClip) -> None:
+        self.clip = clip
+        self._index = 0
+
+    def read(self) -> bytes:
+        if self._index >= self.clip.n_frames:
+            return b''
+        # The Opus encoder wants bytes, copying 3840 of them is the only copy
+        frame = self.clip.frame(self._index).tobytes()
+        self._index += 1
+        return frame
+
+    def is_opus(self) -> bool:
+        return False
+
+
+class ClipCache:
+    """
+    Decoded clips keyed by their source (e.g. an attachment id).
+
+    Clips are decoded by ffmpeg once, written to `directory` and trimmed to
+    `disk_bytes` by evicting the least recently used files. The
+    `mapped_clips` most recently used clips stay memory-mapped. Clips come
+    out measured, reading their `loudness` does not block. Methods are
+    blocking and thread-safe, meant to run through `asyncio.to_thread`.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = config.SOUNDBOARD_CACHE_DIR,
+        disk_bytes: int = config.SOUNDBOARD_CACHE_DISK_BYTES,
+        mapped_clips: int = config.SOUNDBOARD_MAPPED_CLIPS,
+        max_seconds: float = config.SOUNDBOARD_MAX_SECONDS
+    ) -> None:
+        self.directory = Path(directory)
+        self.disk_bytes = disk_bytes
+        self.mapped_clips = mapped_clips
+        self.max_seconds = max_seconds
+        self.hits = 0
+        self.misses = 0
+
+        # key -> clip, in least recently used order
+        self._mapped: OrderedDict[str, PCMClip] = OrderedDict()
+        # key -> (path, size), in least recently used order
+        self._disk: OrderedDict[str, Tuple[Path, int]] = OrderedDict()
+        self._disk_size = 0
+        self._lock = Lock()
+        self._load_index()
+
+    def _load_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for stray in [*self.directory.glob('*.tmp'), *self.directory.glob('*.src')]:
+            stray.unlink(missing_ok=True)
+
+        files = []
+        for path in self.directory.glob('*.pcm'):
+            stat = path.stat()
+            files.append((stat.st_atime, path, stat.st_size))
+
+        for _, path, size in sorted(files):
+            self._disk[path.stem] = (path, size)
+            self._disk_size += size
+        logger.info(f"Clip cache {self.directory} has {len(self._disk)} clips ({self._disk_size} bytes)")
+
+    def get(self, key: str) -> Optional[PCMClip]:
+        """Get the clip stored under `key`, or None."""
+        with self._lock:
+            clip = self._mapped.get(key)
+            if clip is not None:
+                self._mapped.move_to_end(key)
+                self._disk.move_to_end(key)
+                self.hits += 1
+                return clip
+
+            entry = self._disk.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            try:
+                clip = PCMClip(key, entry[0])
+                clip.loudness
+            except (OSError, ValueError):
+                self._drop_disk(key)
+                self.misses += 1
+                return None
+
+            self._disk.move_to_end(key)
+            self._map(clip)
+            self.hits += 1
+            return clip
+
+    def decode(self, key: str, data: bytes, timeout: float = config.SOUNDBOARD_DECODE_TIMEOUT) -> PCMClip:
+        """
+        Decode `data` with ffmpeg and store it under `key`.
+
+        Raises
+        -------
+        ClipError
+            If ffmpeg fails, or there is not a single frame of audio
+        """
+        path = self.directory / f"{key}.pcm"
+        fd, source = tempfile.mkstemp(dir=self.directory, suffix='.src')
+        tmp = path.with_name(path.name + '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            subprocess.run(
+                [
+                    config.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-y',
+                    '-t', f"{self.max_seconds:g}", '-i', source,
+                    '-vn', '-f', 's16le', '-ar', '48000', '-ac', '2', str(tmp),
+                ],
+                stdin=subprocess.DEVNULL, capture_output=True, check=True, timeout=timeout
+            )
+            size = tmp.stat().st_size
+            if size < Encoder.FRAME_SIZE:
+                raise ClipError("The clip has no audio")
+            os.replace(tmp, path)
+        except FileNotFoundError:
+            raise ClipError(f"{config.FFMPEG_PATH} was not found") from None
+        except subprocess.CalledProcessError as e:
+            message = e.stderr.decode(errors='replace').strip().splitlines()
+            raise ClipError(f"ffmpeg failed: {message[-1] if message else e.returncode}") from None
+        except subprocess.TimeoutExpired:
+            raise ClipError(f"ffmpeg timed out after {timeout:.0f}s") from None
+        finally:
+            Path(source).unlink(missing_ok=True)
+            tmp.unlink(missing_ok=True)
+
+        clip = PCMClip(key, path)
+        clip.loudness
+        with self._lock:
+            if key in self._disk:
+                self._drop_disk(key, unlink=False)
+            self._disk[key] = (path, size)
+            self._disk_size += size
+            self._map(clip)
+
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                self._drop_disk(next(iter(self._disk)))
+        return clip
+
+    def _map(self, clip: PCMClip) -> None:
+        self._mapped[clip.key] = clip
+        self._mapped.move_to_end(clip.key)
+        # Unmapped once the sources still playing them are done
+        while len(self._mapped) > self.mapped_clips:
+            self._mapped.popitem(last=False)
+
+    def _drop_disk(self, key: str, unlink: bool = True) -> None:
+        path, size = self._disk.pop(key)
+        self._disk_size -= size
+        self._mapped.pop(key, None)
+        if unlink:
+            # Mappings of the file stay valid until they are closed
+            path.unlink(missing_ok=True)
+
+    def info(self) -> Dict[str, Any]:
+        """Sizes and counters, for monitoring."""
+        with self._lock:
+            return {
+                'mapped_clips': len(self._mapped),
+                'disk_clips': len(self._disk),
+                'disk_bytes': self._disk_size,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
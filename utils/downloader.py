@@ -0,0 +1,154 @@
+"""Bounded, cached downloads of attachments."""
+
+from __future__ import annotations
+import asyncio
+from typing import Hashable, Optional
+
+import aiohttp
+
+import config
+from logger import logger
+from .render_cache import RenderCache
+
+__all__ = [
+    "DownloadTooLarge",
+    "Downloader",
+]
+
+
+class DownloadTooLarge(Exception):
+    """The file is bigger than what the downloader accepts."""
+
+    def __init__(self, size: int, max_bytes: int) -> None:
+        super().__init__(f"Download of {size} bytes exceeds the {max_bytes} bytes cap")
+        self.size = size
+        self.max_bytes = max_bytes
+
+
+class Downloader:
+    """
+    Stream files into memory under a byte cap, keeping recent ones on disk.
+
+    Responses are read in chunks and abandoned as soon as they grow past
+    `max_bytes` or past the size they were announced with, so an oversized
+    file costs at most one chunk over the cap. Given a `cache`, files
+    downloaded with a key (e.g. an attachment id) are stored in it and
+    served from it the next time, without any network I/O. Without one,
+    every fetch downloads.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = config.DOWNLOAD_MAX_BYTES,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+        cache: Optional[RenderCache] = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.timeout = timeout or aiohttp.ClientTimeout(
+            total=config.DOWNLOAD_TIMEOUT,
+            sock_connect=config.DOWNLOAD_CONNECT_TIMEOUT,
+            sock_read=config.DOWNLOAD_READ_TIMEOUT,
+        )
+        self.cache = cache
+        self.bytes_downloaded = 0
+        self.bytes_saved = 0
+
+    def _check_size(self, size: int, declared: Optional[int]) -> None:
+        if size > self.max_bytes:
+            raise DownloadTooLarge(size, self.max_bytes)
+        if declared is not None and size > declared:
+            raise DownloadTooLarge(size, declared)
+
+    async def fetch(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        key: Optional[Hashable] = None,
+        declared_size: Optional[int] = None
+    ) -> Optional[bytes]:
+        """
+        Download `url`, or get it from the cache if `key` is in it.
+
+        Parameters
+        -------
+        session: ClientSession
+            Session to download with
+        url: str
+            What to download
+        key: Hashable | None
+            Cache key of the file, None to bypass the cache (if any)
+        declared_size: int | None
+            Size the file is known to have, e.g. `Attachment.size`
+
+        Return
+        -------
+        The file, or None if the server answered with an error
+
+        Raises
+        -------
+        DownloadTooLarge
+            If the file is over `max_bytes` or its declared size
+        """
+        if declared_size is not None:
+            self._check_size(declared_size, None)
+
+        if key is not None and self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, str(key))
+            if cached is not None:
+                return cached[0]
+
+        async with session.get(url, timeout=self.timeout) as response:
+            if response.status != 200:
+                logger.warning(f"Download of {url} failed with status {response.status}")
+                return None
+            if response.content_length is not None:
+                self._check_size(response.content_length, declared_size)
+
+            chunks = []
+            size = 0
+            async for chunk in response.content.iter_chunked(config.DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                self._check_size(size, declared_size)
+                chunks.append(chunk)
+
+        data = b''.join(chunks)
+        self.bytes_downloaded += size
+        if key is not None and self.cache is not None:
+            await asyncio.to_thread(self.cache.put, str(key), data, 'bin')
+        return data
+
+    async def fetch_variant(
+        self,
+        session: aiohttp.ClientSession,
+        variant_url: str,
+        url: str,
+        key: Optional[Hashable] = None,
+        declared_size: Optional[int] = None
+    ) -> Optional[bytes]:
+        """
+        Download a smaller variant of a file, or the file itself if that fails.
+
+        `declared_size` is the size of the original file; what the variant
+        saves compared to it is added to `bytes_saved`. The variant itself is
+        only held to `max_bytes`, it can come out bigger than the original.
+        """
+        if declared_size is not None:
+            self._check_size(declared_size, None)
+
+        downloaded = self.bytes_downloaded
+        try:
+            data = await self.fetch(
+                session, variant_url,
+                key=None if key is None else f"{key}-variant"
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, DownloadTooLarge) as e:
+            logger.warning(f"Download of variant {variant_url} failed: {e}")
+            data = None
+
+        if data is None:
+            return await self.fetch(session, url, key, declared_size)
+
+        # Cache hits save nothing over the cached original
+        if declared_size is not None and self.bytes_downloaded > downloaded:
+            self.bytes_saved += max(0, declared_size - len(data))
+        return data
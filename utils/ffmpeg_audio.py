@@ -1,14 +1,31 @@
 import subprocess
 import shlex
-import io
+import threading
+import queue
+from typing import IO, Union
 import discord
-from config import FFMPEG_PATH
+from config import AUDIO_OPUS_BITRATE, AUDIO_PIPE_CHUNK_SIZE, AUDIO_READ_AHEAD_FRAMES, FFMPEG_PATH
 from discord.opus import Encoder
+from logger import logger
+
+__all__ = [
+    "FFmpegPCMAudio",
+    "ffmpeg_audio",
+]
 
 
 class FFmpegPCMAudio(discord.AudioSource):
+    """
+    Audio source decoding anything ffmpeg reads into 48 kHz stereo s16le.
+
+    The output is streamed: a reader thread keeps at most
+    `AUDIO_READ_AHEAD_FRAMES` frames decoded ahead of playback, so the first
+    frame is ready as soon as ffmpeg produces it and memory does not grow
+    with the length of the clip. With `pipe=True`, `source` (bytes or a
+    binary file) is fed to ffmpeg's stdin by a writer thread.
+    """
+
     def __init__(self, source, *, executable=FFMPEG_PATH, pipe=False, stderr=None, before_options=None, options=None):
-        stdin = None if not pipe else source
         args = [executable]
         if isinstance(before_options, str):
             args.extend(shlex.split(before_options))
@@ -21,14 +38,14 @@ class FFmpegPCMAudio(discord.AudioSource):
             args.extend(shlex.split(options))
         args.append('pipe:1')
         self._process = None
+        self._stopped = threading.Event()
+        self._ended = False
+        self._frames: queue.Queue[bytes] = queue.Queue(maxsize=AUDIO_READ_AHEAD_FRAMES)
 
         try:
             self._process = subprocess.Popen(
-                args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
-            self._stdout = io.BytesIO(
-                self._process.communicate(
-                    input=stdin)[0]
-            )
+                args, stdin=subprocess.PIPE if pipe else subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=stderr)
         except FileNotFoundError:
 
             raise discord.ClientException(
@@ -37,19 +54,104 @@ class FFmpegPCMAudio(discord.AudioSource):
             raise discord.ClientException(
                 'Popen failed: {0.__class__.__name__}: {0}'.format(exc)) from exc
 
+        pid = self._process.pid
+        self._writer = None
+        if pipe:
+            self._writer = threading.Thread(
+                target=self._pipe_writer, args=(source, self._process.stdin),
+                name=f'ffmpeg-stdin-writer:pid-{pid}', daemon=True)
+            self._writer.start()
+        self._reader = threading.Thread(
+            target=self._pipe_reader, args=(self._process.stdout,),
+            name=f'ffmpeg-stdout-reader:pid-{pid}', daemon=True)
+        self._reader.start()
+
+    def _pipe_writer(self, source: Union[bytes, IO[bytes]], stdin: IO[bytes]) -> None:
+        """Feed `source` to ffmpeg in chunks, then close its stdin."""
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                view = memoryview(source)
+                for start in range(0, len(view), AUDIO_PIPE_CHUNK_SIZE):
+                    if self._stopped.is_set():
+                        break
+                    stdin.write(view[start:start + AUDIO_PIPE_CHUNK_SIZE])
+            else:
+                while not self._stopped.is_set():
+                    chunk = source.read(AUDIO_PIPE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # ffmpeg exited or was killed, there is nobody left to write to
+            pass
+        except Exception as e:
+            logger.warning(f"Could not feed audio to ffmpeg: {e}")
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _pipe_reader(self, stdout: IO[bytes]) -> None:
+        """Read whole frames ahead of playback, blocking while the buffer is full."""
+        try:
+            while not self._stopped.is_set():
+                frame = stdout.read(Encoder.FRAME_SIZE)
+                if len(frame) != Encoder.FRAME_SIZE:
+                    break
+                self._put(frame)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._put(b'')
+
+    def _put(self, frame: bytes) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._frames.put(frame, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
     def read(self):
-        ret = self._stdout.read(Encoder.FRAME_SIZE)
-        if len(ret) != Encoder.FRAME_SIZE:
-            return b''
-        return ret
+        while not self._ended and not self._stopped.is_set():
+            try:
+                frame = self._frames.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if frame:
+                return frame
+            self._ended = True
+        return b''
 
     def cleanup(self):
         proc = self._process
 
         if proc is None:
             return
+        self._stopped.set()
         proc.kill()
-        if proc.poll() is None:
-            proc.communicate()
+        proc.wait()
+        for thread in (self._reader, self._writer):
+            if thread is not None and thread is not threading.current_thread():
+                thread.join(timeout=1)
+        if proc.stdout is not None:
+            proc.stdout.close()
 
         self._process = None
+
+
+def ffmpeg_audio(source, *, pcm=False, **kwargs) -> discord.AudioSource:
+    """
+    Get an ffmpeg audio source: Opus passthrough, or PCM if `pcm` is True.
+
+    PCM is needed whenever the samples are processed in Python, e.g. by a
+    volume transformer or a mixer. Otherwise discord.py's `FFmpegOpusAudio`
+    lets ffmpeg encode Opus and sends its packets as they are, saving the
+    encoding of every frame in Python. Takes the arguments of
+    `FFmpegPCMAudio`, but only `FFmpegPCMAudio` pipes bytes.
+    """
+    kwargs.setdefault('executable', FFMPEG_PATH)
+    if pcm:
+        return FFmpegPCMAudio(source, **kwargs)
+    return discord.FFmpegOpusAudio(source, bitrate=AUDIO_OPUS_BITRATE, **kwargs)
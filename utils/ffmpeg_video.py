@@ -0,0 +1,206 @@
+"""Composite rendered images onto videos with ffmpeg, without decoding frames in Python."""
+
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import tempfile
+from typing import AsyncIterator, List, Optional, Tuple
+
+import config
+from logger import logger
+
+__all__ = [
+    "VideoError",
+    "VideoInfo",
+    "video_file",
+    "probe_video",
+    "fit_video",
+    "overlay_video",
+]
+
+
+class VideoError(Exception):
+    """ffmpeg could not read or encode a video."""
+
+
+@dataclass(frozen=True)
+class VideoInfo:
+    """Size and duration of the first video stream of a file."""
+
+    width: int
+    height: int
+    duration: Optional[float]
+    has_audio: bool
+
+
+@asynccontextmanager
+async def video_file(data: bytes, suffix: str = '') -> AsyncIterator[Path]:
+    """
+    Write `data` to a temporary file for the length of the block.
+
+    ffmpeg needs to seek in most containers (MP4 keeps its index at the end),
+    so videos are read from a file rather than from a pipe.
+    """
+    fd, name = tempfile.mkstemp(suffix=suffix)
+    path = Path(name)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            await asyncio.to_thread(file.write, data)
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
+
+
+async def _run(args: List[str], stdin: Optional[bytes], timeout: float) -> bytes:
+    """Run a command to completion and get its output, killing it on timeout or cancellation."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+    except FileNotFoundError:
+        raise VideoError(f"{args[0]} was not found") from None
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(stdin), timeout)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        process.kill()
+        await process.wait()
+        if isinstance(e, asyncio.TimeoutError):
+            raise VideoError(f"{Path(args[0]).name} timed out after {timeout:.0f}s") from None
+        raise
+
+    if process.returncode != 0:
+        message = stderr.decode(errors='replace').strip().splitlines()
+        raise VideoError(f"{Path(args[0]).name} failed: {message[-1] if message else process.returncode}")
+    return stdout
+
+
+async def probe_video(path: Path, timeout: float = 30.0) -> VideoInfo:
+    """
+    Get the size and duration of a video with ffprobe.
+
+    Raises
+    -------
+    VideoError
+        If the file has no video stream or cannot be read
+    """
+    output = await _run(
+        [
+            config.FFPROBE_PATH, '-v', 'error',
+            '-show_entries', 'stream=codec_type,width,height:format=duration',
+            '-of', 'json', str(path),
+        ],
+        None, timeout
+    )
+    info = json.loads(output)
+    streams = info.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    if video is None or not video.get('width') or not video.get('height'):
+        raise VideoError("No video stream found")
+
+    try:
+        duration: Optional[float] = float(info.get('format', {})['duration'])
+    except (KeyError, TypeError, ValueError):
+        duration = None
+
+    return VideoInfo(
+        width=int(video['width']),
+        height=int(video['height']),
+        duration=duration,
+        has_audio=any(stream.get('codec_type') == 'audio' for stream in streams),
+    )
+
+
+def fit_video(width: int, height: int, max_dimension: int = config.MEDIA_VIDEO_MAX_DIMENSION) -> Tuple[int, int]:
+    """Output size of a video: within `max_dimension`, with even sides as H.264 wants."""
+    factor = min(1.0, max_dimension / max(width, height))
+    return (
+        max(2, int(width * factor) // 2 * 2),
+        max(2, int(height * factor) // 2 * 2),
+    )
+
+
+async def overlay_video(
+    path: Path,
+    overlay: bytes,
+    size: Tuple[int, int],
+    canvas: Tuple[int, int],
+    position: Tuple[int, int],
+    duration: Optional[float] = None,
+    size_limit: Optional[int] = None,
+    max_seconds: float = config.MEDIA_VIDEO_MAX_SECONDS,
+    timeout: float = config.MEDIA_VIDEO_TIMEOUT
+) -> bytes:
+    """
+    Scale a video, place it on a canvas and composite a PNG over it, all in ffmpeg.
+
+    The overlay is fed through stdin and the output, a fragmented MP4, is
+    read from stdout, so no frame is decoded in Python and nothing but the
+    input touches the disk.
+
+    Parameters
+    -------
+    path: Path
+        Input video
+    overlay: bytes
+        PNG of size `canvas`, composited over the whole output
+    size: Tuple[int, int]
+        Size the video is scaled to
+    canvas: Tuple[int, int]
+        Size of the output, at least `size`; uncovered areas are white
+    position: Tuple[int, int]
+        Where the video goes on the canvas
+    duration: float | None
+        Duration of the input, if known, to pick a bitrate that fits
+    size_limit: int | None
+        Maximum size of the output, in bytes. Encoding stops once it is
+        reached, so the output may be cut short
+    max_seconds: float
+        Inputs are cut after this many seconds
+    timeout: float
+        ffmpeg is killed after this many seconds
+
+    Return
+    -------
+    The encoded MP4
+
+    Raises
+    -------
+    VideoError
+        If ffmpeg fails or times out
+    """
+    seconds = min(duration or max_seconds, max_seconds)
+    filters = (
+        f"[0:v]scale={size[0]}:{size[1]},setsar=1,"
+        f"pad={canvas[0]}:{canvas[1]}:{position[0]}:{position[1]}:color=white[video];"
+        f"[video][1:v]overlay=0:0:format=auto,format=yuv420p[out]"
+    )
+    args = [
+        config.FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+        '-t', f"{max_seconds:g}", '-i', str(path),
+        '-f', 'png_pipe', '-i', 'pipe:0',
+        '-filter_complex', filters,
+        '-map', '[out]', '-map', '0:a?',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(config.MEDIA_VIDEO_CRF),
+        '-c:a', 'aac', '-b:a', str(config.MEDIA_VIDEO_AUDIO_BITRATE),
+    ]
+    if size_limit is not None:
+        # Keep some room for the container, the CRF alone may overshoot
+        bitrate = max(100_000, int(size_limit * 8 * 0.9 / seconds) - config.MEDIA_VIDEO_AUDIO_BITRATE)
+        args += ['-maxrate', str(bitrate), '-bufsize', str(2 * bitrate), '-fs', str(size_limit)]
+    args += [
+        # Fragmented, so the index is not needed before the data and it can be piped
+        '-movflags', 'frag_keyframe+empty_moov+default_base_moof',
+        '-f', 'mp4', 'pipe:1',
+    ]
+
+    if duration is not None and duration > max_seconds:
+        logger.info(f"Cutting a {duration:.1f}s video to {max_seconds:g}s")
+    return await _run(args, overlay, timeout)
@@ -0,0 +1,102 @@
+"""Process-wide TrueType font cache shared by all text rendering code."""
+
+from __future__ import annotations
+from collections import OrderedDict
+from io import BytesIO
+from pathlib import Path
+from threading import Lock
+from typing import Union
+import os
+
+from PIL import ImageFont
+
+import config
+from logger import logger
+
+__all__ = [
+    "FontRegistry",
+    "font_registry",
+    "get_font",
+]
+
+FontType = Union[ImageFont.FreeTypeFont, ImageFont.ImageFont]
+
+
+class FontRegistry:
+    """
+    Load every font file once and keep a bounded LRU of sized fonts.
+
+    Font files are read into memory on first use, so creating a new size
+    only costs a FreeType face from bytes instead of reparsing the file.
+    """
+
+    def __init__(self, max_fonts: int = config.FONT_CACHE_SIZE) -> None:
+        self.max_fonts = max_fonts
+        self.hits = 0
+        self.misses = 0
+        self._files: dict[str, bytes] = {}
+        self._fonts: OrderedDict[tuple[str, int], FontType] = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def _normalize(font_filename: Union[str, Path]) -> str:
+        return os.path.abspath(os.fspath(font_filename))
+
+    def load_file(self, font_filename: Union[str, Path]) -> bytes:
+        """Read a font file into memory, once per process."""
+        path = self._normalize(font_filename)
+        data = self._files.get(path)
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            self._files[path] = data
+        return data
+
+    def get(self, font_filename: Union[str, Path], font_size: int) -> FontType:
+        """Get a font at `font_size`, falling back to Pillow's default font."""
+        key = (self._normalize(font_filename), int(font_size))
+
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+
+        try:
+            font = ImageFont.truetype(BytesIO(self.load_file(key[0])), key[1])
+        except OSError:
+            logger.warning(f"Could not load font {font_filename}, using default")
+            font = ImageFont.load_default()
+
+        with self._lock:
+            self._fonts[key] = font
+            self._fonts.move_to_end(key)
+            while len(self._fonts) > self.max_fonts:
+                self._fonts.popitem(last=False)
+
+        return font
+
+    def stats(self) -> dict[str, int]:
+        """Get cache counters."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "fonts": len(self._fonts),
+            "files": len(self._files),
+        }
+
+    def clear(self) -> None:
+        """Drop every cached font and file."""
+        with self._lock:
+            self._fonts.clear()
+            self._files.clear()
+
+
+font_registry = FontRegistry()
+
+
+def get_font(font_filename: Union[str, Path], font_size: int) -> FontType:
+    """Get a sized font from the process-wide registry."""
+    return font_registry.get(font_filename, font_size)
@@ -0,0 +1,134 @@
+"""Bounded-search font sizing with memoized results."""
+
+from __future__ import annotations
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import config
+from .font_cache import get_font
+from .text_layout import layout_text
+
+__all__ = [
+    "fit_font_size",
+]
+
+MIN_FONT_SIZE = 1
+
+
+def _largest_fitting(fits: Callable[[int], bool], lo: int, hi: int) -> Optional[int]:
+    """
+    Binary search the largest size in [lo, hi] for which `fits` holds.
+
+    Takes at most log2(hi - lo + 1) + 1 steps, whatever the text looks like.
+    """
+    best = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        if fits(mid):
+            best = mid
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    return best
+
+
+def _fit_box(
+    text: str,
+    font_filename: str,
+    max_width: Optional[int],
+    max_height: Optional[int],
+    max_size: int
+) -> int:
+    def fits(size: int) -> bool:
+        bbox = get_font(font_filename, size).getbbox(text)
+        return (max_width is None or bbox[2] - bbox[0] <= max_width) and \
+               (max_height is None or bbox[3] - bbox[1] <= max_height)
+
+    return _largest_fitting(fits, MIN_FONT_SIZE, max_size) or MIN_FONT_SIZE
+
+
+def _fit_band(
+    text: str,
+    font_filename: str,
+    box_width: int,
+    img_height: int,
+    line_spacing: float,
+    lower: float,
+    upper: float,
+    max_size: int
+) -> int:
+    def too_short(size: int) -> bool:
+        layout = layout_text(text, font_filename, size, box_width, line_spacing)
+        return layout.total_height < lower * img_height
+
+    def fits(size: int) -> bool:
+        layout = layout_text(text, font_filename, size, box_width, line_spacing)
+        band = upper + 0.02 * len(layout.lines)
+        return layout.total_height <= band * img_height and layout.width <= box_width
+
+    # Smallest size reaching the bottom of the band...
+    size = (_largest_fitting(too_short, MIN_FONT_SIZE, max_size) or 0) + 1
+    size = min(size, max_size)
+
+    # ...unless wrapping makes it overshoot the top of the band or the box
+    if not fits(size):
+        size = _largest_fitting(fits, MIN_FONT_SIZE, size - 1) or MIN_FONT_SIZE
+
+    return size
+
+
+@lru_cache(maxsize=config.FONT_FIT_CACHE_SIZE)
+def fit_font_size(
+    text: str,
+    font_filename: Union[str, Path],
+    box_width: Optional[int] = None,
+    img_height: Optional[int] = None,
+    *,
+    max_height: Optional[int] = None,
+    line_spacing: float = 1.1,
+    lower: float = 0.1,
+    upper: float = 0.2,
+    max_size: int = config.MAX_FONT_SIZE
+) -> int:
+    """
+    Find a font size for `text` by bounded binary search.
+
+    With `img_height`, the text is wrapped to `box_width` and its total height
+    must land between `lower` and `upper` (plus 2% per line) of `img_height`.
+    Otherwise the text is kept on a single line that must fit within
+    `box_width` x `max_height`.
+
+    Results are memoized on every argument, so repeated captions and per-frame
+    calls cost a dictionary lookup.
+
+    Parameters
+    -------
+    text: str
+        The text to fit
+    font_filename: str | Path
+        Path of the TrueType font
+    box_width: int | None
+        Maximum width of a line
+    img_height: int | None
+        Height of the image the text is written on (wrapping mode)
+    max_height: int | None
+        Maximum height of the line (single line mode)
+
+    Return
+    -------
+    The chosen font size, between 1 and `max_size`
+    """
+    font_filename = str(font_filename)
+
+    if img_height is not None:
+        if box_width is None:
+            raise ValueError('box_width is required to wrap text')
+        return _fit_band(
+            text, font_filename, box_width, img_height,
+            line_spacing, lower, upper, max_size
+        )
+
+    if box_width is None and max_height is None:
+        raise ValueError('You need to pass box_width or max_height')
+    return _fit_box(text, font_filename, box_width, max_height, max_size)
@@ -1,4 +1,101 @@
+import time
+from collections import OrderedDict
+
 import discord
+from yarl import URL
+
+import config
+
+__all__ = [
+    "get_referenced_message",
+    "find_attachment",
+    "get_attachment",
+    "get_attachments",
+    "resized_proxy_url",
+]
+
+# Referenced messages fetched from the API: id -> (fetched at, message)
+_fetched_messages: OrderedDict[int, tuple[float, discord.Message]] = OrderedDict()
+
+
+async def get_referenced_message(message: discord.Message) -> discord.Message | None:
+    """
+    Get the message `message` replies to, fetching it only as a last resort
+
+    Looks at the resolved reference, then the client's message cache, then
+    recently fetched messages, before asking the API.
+
+    Parameters
+    -------
+    message: discord.Message
+        The replying message
+
+    Return
+    -------
+    The referenced message, or None if there is none or it was deleted
+    """
+    if (ref := message.reference) is None or ref.message_id is None:
+        return None
+
+    if isinstance(ref.resolved, discord.Message):
+        return ref.resolved
+    if isinstance(ref.resolved, discord.DeletedReferencedMessage):
+        return None
+    if ref.cached_message is not None:
+        return ref.cached_message
+
+    cached = _fetched_messages.get(ref.message_id)
+    if cached is not None:
+        fetched_at, msg = cached
+        if time.monotonic() - fetched_at <= config.MESSAGE_CACHE_TTL:
+            _fetched_messages.move_to_end(ref.message_id)
+            return msg
+        del _fetched_messages[ref.message_id]
+
+    try:
+        msg = await message.channel.fetch_message(ref.message_id)
+    except discord.NotFound:
+        return None
+
+    _fetched_messages[ref.message_id] = (time.monotonic(), msg)
+    while len(_fetched_messages) > config.MESSAGE_CACHE_SIZE:
+        _fetched_messages.popitem(last=False)
+    return msg
+
+
+async def find_attachment(
+    message: discord.Message,
+    kinds: dict[str, list[str]]
+) -> tuple[discord.Attachment, str] | None:
+    """
+    Find the first attachment of any of several kinds, in one pass
+    Priority: original message > reference message
+
+    Parameters
+    -------
+    message: discord.Message
+        The original message
+    kinds: dict[str, list[str]]
+        Content types of every kind of attachment, e.g. {"gif": ["image/gif"]}
+
+    Return
+    -------
+    The attachment and its kind
+    """
+    def classify(msg: discord.Message) -> tuple[discord.Attachment, str] | None:
+        for attachment in msg.attachments:
+            for kind, content_types in kinds.items():
+                if attachment.content_type in content_types:
+                    return attachment, kind
+        return None
+
+    if (found := classify(message)) is not None:
+        return found
+
+    if (msg := await get_referenced_message(message)) is not None:
+        return classify(msg)
+
+    return None
 
 
 async def get_attachment(message: discord.Message, content_type: str | list[str]) -> discord.Attachment | None:
@@ -24,8 +121,7 @@ async def get_attachment(message: discord.Message, content_type: str | list[str]
         if attachment.content_type in content_type:
             return attachment
 
-    if (ref := message.reference) is not None:
-        msg = await message.channel.fetch_message(ref.message_id)
+    if (msg := await get_referenced_message(message)) is not None:
         for attachment in msg.attachments:
             if attachment.content_type in content_type:
                 return attachment
@@ -54,11 +150,34 @@ async def get_attachments(message: discord.Message, content_type: str | list[str
     original_attachments = filter(
         lambda a: a.content_type in content_type, message.attachments)
 
-    if (ref := message.reference) is not None:
-        msg = await message.channel.fetch_message(ref.message_id)
+    if (msg := await get_referenced_message(message)) is not None:
         ref_attachments = filter(
             lambda a: a.content_type in content_type, msg.attachments)
 
         return list(original_attachments) + list(ref_attachments)
 
     return list(original_attachments)
+
+
+def resized_proxy_url(attachment: discord.Attachment, size: tuple[int, int]) -> str | None:
+    """
+    Get the media proxy URL of an image attachment resized by Discord
+
+    Parameters
+    -------
+    attachment: discord.Attachment
+        An image attachment
+    size: tuple[int, int]
+        The wanted width and height
+
+    Return
+    -------
+    The URL of the resized variant, or None if it would not be smaller
+    """
+    if attachment.width is None or attachment.height is None:
+        return None
+    if size[0] >= attachment.width and size[1] >= attachment.height:
+        return None
+
+    url = URL(attachment.proxy_url)
+    return str(url.update_query(width=size[0], height=size[1]))
@@ -0,0 +1,390 @@
+"""Animated GIF output: palette quantization, frame timing and streaming encoding."""
+
+from __future__ import annotations
+import hashlib
+from io import BytesIO
+import logging
+import multiprocessing
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageSequence
+
+import config
+from logger import logger
+
+__all__ = [
+    "TRANSPARENT_INDEX",
+    "build_palette",
+    "quantize_frame",
+    "frame_timing",
+    "GIF_TRAILER",
+    "gif_header",
+    "GifWriter",
+    "plan_animation",
+    "encode_frames",
+    "encode_animation",
+]
+
+# Palettes hold 255 colours, the last index is kept for transparency
+TRANSPARENT_INDEX = 255
+DEFAULT_DURATION = 100
+
+
+def build_palette(
+    frames: Iterable[Image.Image],
+    colors: int = 255
+) -> Image.Image:
+    """
+    Compute one adaptive palette from sampled frames.
+
+    Each frame is shrunk as soon as it arrives and the thumbnails are stacked
+    into a single image, which is then quantized, so the cost does not depend
+    on the frame size.
+    """
+    thumbs = []
+    for frame in frames:
+        thumb = frame.convert('RGB')
+        thumb.thumbnail((config.GIF_PALETTE_SAMPLE_SIZE, config.GIF_PALETTE_SAMPLE_SIZE))
+        thumbs.append(thumb)
+
+    width = max(thumb.width for thumb in thumbs)
+    sheet = Image.new('RGB', (width, sum(thumb.height for thumb in thumbs)))
+    y = 0
+    for thumb in thumbs:
+        sheet.paste(thumb, (0, y))
+        y += thumb.height
+
+    return sheet.quantize(colors=colors, method=Image.Quantize.FASTOCTREE)
+
+
+def quantize_frame(
+    frame: Image.Image,
+    palette: Optional[Image.Image] = None,
+    dither: bool = False,
+    colors: int = 255
+) -> Image.Image:
+    """
+    Convert a frame to a 'P' image, with a shared `palette` or its own one.
+
+    Pixels that are mostly transparent are mapped to `TRANSPARENT_INDEX`.
+    """
+    rgb = frame.convert('RGB')
+    dither_mode = Image.Dither.FLOYDSTEINBERG if dither else Image.Dither.NONE
+
+    if palette is None:
+        quantized = rgb.quantize(colors=colors, method=Image.Quantize.FASTOCTREE, dither=dither_mode)
+    else:
+        quantized = rgb.quantize(palette=palette, dither=dither_mode)
+
+    if frame.mode == 'RGBA' and frame.getextrema()[3][0] < 128:
+        indices = np.array(quantized)
+        indices[np.asarray(frame.getchannel('A')) < 128] = TRANSPARENT_INDEX
+        transparent = Image.fromarray(indices, 'P')
+        transparent.putpalette(quantized.getpalette())
+        transparent.info['transparency'] = TRANSPARENT_INDEX
+        return transparent
+
+    return quantized
+
+
+def frame_timing(frame: Image.Image) -> Tuple[int, int]:
+    """Get the (duration, disposal) of the current frame of a source GIF."""
+    duration = int(frame.info.get('duration') or DEFAULT_DURATION)
+    disposal = int(getattr(frame, 'disposal_method', 0) or 0)
+    return duration, disposal
+
+
+GIF_TRAILER = b';'
+
+
+def gif_header(frame: Image.Image, loop: Optional[int] = 0) -> bytes:
+    """
+    Build the header of an animated GIF.
+
+    The logical screen takes the size of `frame` and the global colour table
+    its palette.
+    """
+    frame = frame.copy()
+    frame.info['version'] = b'89a'
+    info = {} if loop is None else {'loop': loop}
+    header, _ = GifImagePlugin.getheader(frame, info=info)
+    return b''.join(header)
+
+
+class GifWriter:
+    """
+    Write the frames of an animated GIF one at a time.
+
+    Every frame is quantized and LZW-encoded straight into `fp`, one frame
+    behind so that frames which turn out identical after quantization can be
+    merged into it. With a shared palette, opaque frames only store the
+    bounding box of the pixels that changed since the previous frame, drawn
+    over it (disposal 1). A frame followed by a transparent one is written
+    whole and cleared once shown (disposal 2), so the transparent pixels
+    do not show it. The header (see `gif_header`) and the trailer are left
+    to the caller, so frames can be encoded in separate chunks and
+    concatenated; call `close` to write the last frame.
+    """
+
+    def __init__(
+        self,
+        fp: BinaryIO,
+        palette: Optional[Image.Image] = None,
+        colors: int = 255
+    ) -> None:
+        """
+        Parameters
+        -------
+        fp: BinaryIO
+            Where the frames are written
+        palette: Image | None
+            Shared palette of every frame, or None if each frame has its own
+        colors: int
+            Size of the per-frame palettes, without a shared one
+        """
+        self.fp = fp
+        self.palette = palette
+        self.colors = colors
+        self.frames = 0
+        self.merged = 0
+        self.bytes_written = 0
+        self.size: Optional[Tuple[int, int]] = None
+        # Next frame to write: [image, offset, params, whole image]
+        self._pending: Optional[list] = None
+        # Palette indices of the last frame, if later frames may be deltas
+        self._previous: Optional[np.ndarray] = None
+
+    def write(self, frame: Image.Image, duration: int, disposal: int = 0) -> None:
+        """Quantize a fully composed frame and append it."""
+        quantized = quantize_frame(frame, self.palette, colors=self.colors)
+        self.size = quantized.size
+        transparent = 'transparency' in quantized.info
+
+        params = {
+            'duration': duration,
+            'disposal': disposal,
+            'include_color_table': self.palette is None,
+        }
+        if transparent:
+            params['transparency'] = TRANSPARENT_INDEX
+            # Frames are fully composed, so transparent pixels must not show
+            # the previous frame through: restore to background after those
+            params['disposal'] = 2
+            self._clear_pending()
+
+        indices = None
+        image, offset = quantized, (0, 0)
+        if self.palette is not None and not transparent:
+            indices = np.asarray(quantized)
+            # Opaque frames are drawn over the previous one, which must stay
+            params['disposal'] = 1
+
+            if self._previous is not None and self._previous.shape == indices.shape:
+                changed = indices != self._previous
+                rows = np.flatnonzero(changed.any(axis=1))
+                if not rows.size:
+                    self.extend(duration)
+                    self.merged += 1
+                    return
+                cols = np.flatnonzero(changed.any(axis=0))
+                box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+                image, offset = quantized.crop(box), box[:2]
+
+        self._flush()
+        self._pending = [image, offset, params, quantized]
+        self._previous = indices
+
+    def extend(self, duration: int) -> None:
+        """Show the last frame for `duration` more milliseconds."""
+        self._pending[2]['duration'] += duration
+
+    def close(self) -> None:
+        """
+        Write the last frame.
+
+        The frame after it, in the next chunk or the first one once the GIF
+        loops, may be transparent, so it is cleared once shown.
+        """
+        self._clear_pending()
+        self._flush()
+
+    def _clear_pending(self) -> None:
+        """Write the pending frame whole and restore to background after it."""
+        if self._pending is None:
+            return
+        params = self._pending[2]
+        params['disposal'] = 2
+        # No pixel uses it, but decoders like Pillow only restore to
+        # transparent rather than the background colour if the frame has one
+        params['transparency'] = TRANSPARENT_INDEX
+        self._pending = [self._pending[3], (0, 0), params, self._pending[3]]
+        # The next frame is drawn on a clear canvas, not over this one
+        self._previous = None
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+        image, offset, params, _ = self._pending
+        for chunk in GifImagePlugin.getdata(image, offset, **params):
+            self.fp.write(chunk)
+            self.bytes_written += len(chunk)
+        self.frames += 1
+        self._pending = None
+
+
+def _frame_digest(frame: Image.Image) -> bytes:
+    return hashlib.blake2b(frame.mode.encode() + frame.tobytes(), digest_size=16).digest()
+
+
+def _sample_indices(n_frames: int, samples: int) -> list[int]:
+    step = max(1, n_frames // max(1, samples))
+    return list(range(0, n_frames, step))[:samples]
+
+
+def plan_animation(
+    gif: Image.Image,
+    compose: Callable[[Image.Image], Image.Image],
+    palette_mode: str = config.GIF_PALETTE,
+    colors: int = 255
+) -> Tuple[bytes, Optional[Image.Image]]:
+    """
+    Build the header and the shared palette for rendering `gif` through `compose`.
+
+    Return
+    -------
+    The GIF header and the global palette, None in "local" palette mode
+    """
+    palette = None
+    gif.seek(0)
+
+    if palette_mode == 'global':
+        n_frames = getattr(gif, 'n_frames', 1)
+        sizes = []
+
+        def samples() -> Iterator[Image.Image]:
+            for index in _sample_indices(n_frames, config.GIF_PALETTE_SAMPLES):
+                gif.seek(index)
+                frame = compose(gif)
+                sizes.append(frame.size)
+                yield frame
+
+        palette = build_palette(samples(), colors)
+        first = Image.new('P', sizes[0])
+        first.putpalette(palette.getpalette())
+    else:
+        first = quantize_frame(compose(gif), colors=colors)
+
+    gif.seek(0)
+    return gif_header(first, gif.info.get('loop')), palette
+
+
+def _status_kib(field: str) -> Optional[int]:
+    """A memory figure of this process from /proc/self/status, in KiB."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def encode_frames(
+    gif: Image.Image,
+    compose: Callable[[Image.Image], Image.Image],
+    palette: Optional[Image.Image] = None,
+    start: int = 0,
+    stop: Optional[int] = None,
+    stride: int = 1,
+    colors: int = 255
+) -> bytes:
+    """
+    Render frames [start, stop) of `gif` through `compose` and encode them.
+
+    Frames go from the decoder through `compose` and the quantizer to the
+    encoder one at a time, so peak memory is about one decoded frame plus the
+    encoded output. Seeking to `start` decodes every earlier frame, since GIF
+    frames build on each other.
+
+    With a `stride` above 1, only one frame out of `stride` is kept (`start`
+    should be a multiple of it) and it lasts as long as the frames it stands
+    for. Kept frames identical to the previous one are not rendered at all,
+    their duration is added to it.
+
+    Return
+    -------
+    The encoded frames, without header or trailer
+    """
+    # RSS is the process', it only measures this job in a process worker
+    measure = logger.isEnabledFor(logging.DEBUG) and multiprocessing.parent_process() is not None
+    rss_before = rss_peak = _status_kib('VmRSS') if measure else None
+
+    with BytesIO() as output:
+        writer = GifWriter(output, palette, colors)
+        digest = None
+        duplicates = index = 0
+        for index, frame in enumerate(ImageSequence.Iterator(gif)):
+            if index < start:
+                continue
+            if stop is not None and index >= stop:
+                break
+            duration, disposal = frame_timing(frame)
+
+            if (index - start) % stride:
+                writer.extend(duration)
+                continue
+
+            previous, digest = digest, _frame_digest(frame)
+            if digest == previous:
+                writer.extend(duration)
+                duplicates += 1
+                continue
+            writer.write(compose(frame), duration, disposal)
+            if rss_peak is not None:
+                rss_peak = max(rss_peak, _status_kib('VmRSS') or 0)
+
+        writer.close()
+
+        if logger.isEnabledFor(logging.DEBUG):
+            used = f"{rss_peak - rss_before} KiB" if rss_before is not None else "not measured"
+            logger.debug(
+                f"Encoded frames {start}-{index} at {writer.size} into {writer.frames} frames "
+                f"({duplicates} duplicates, {writer.merged} merged after quantization): "
+                f"{writer.bytes_written} bytes, job memory {used}"
+            )
+
+        return output.getvalue()
+
+
+def encode_animation(
+    gif: Image.Image,
+    compose: Callable[[Image.Image], Image.Image],
+    palette_mode: str = config.GIF_PALETTE,
+    stride: int = 1,
+    colors: int = 255
+) -> bytes:
+    """
+    Render every frame of `gif` through `compose` and stream it to a GIF.
+
+    Parameters
+    -------
+    gif: Image
+        An opened animated image
+    compose: Callable[[Image], Image]
+        Turns a source frame into a fully composed output frame
+    palette_mode: str
+        "global" for one palette computed from sampled frames, "local" for
+        one palette per frame
+    stride: int
+        Keep one frame out of `stride`, see `encode_frames`
+    colors: int
+        Number of palette colours
+
+    Return
+    -------
+    The encoded GIF
+    """
+    header, palette = plan_animation(gif, compose, palette_mode, colors)
+    return header + encode_frames(gif, compose, palette, stride=stride, colors=colors) + GIF_TRAILER
@@ -0,0 +1,127 @@
+"""Glyph atlas: stroked glyphs rasterized once, then blitted into lines."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+import config
+from .font_cache import get_font
+
+__all__ = [
+    "Glyph",
+    "get_glyph",
+    "draw_text_line",
+]
+
+
+@dataclass(frozen=True)
+class Glyph:
+    """Coverage masks of one character, relative to the pen position."""
+
+    fill: Optional[np.ndarray]
+    fill_offset: Tuple[int, int]
+    stroke: Optional[np.ndarray]
+    stroke_offset: Tuple[int, int]
+
+
+def _rasterize(font, char: str, stroke_width: int) -> Tuple[Optional[np.ndarray], Tuple[int, int]]:
+    left, top, right, bottom = font.getbbox(char, stroke_width=stroke_width)
+    if right <= left or bottom <= top:
+        return None, (0, 0)
+
+    mask = Image.new('L', (right - left, bottom - top))
+    ImageDraw.Draw(mask).text(
+        (-left, -top), char, font=font, fill=255,
+        stroke_width=stroke_width, stroke_fill=255
+    )
+    array = np.asarray(mask)
+    array.setflags(write=False)
+    return array, (left, top)
+
+
+@lru_cache(maxsize=config.GLYPH_ATLAS_CACHE_SIZE)
+def get_glyph(font_filename: str, font_size: int, char: str, stroke_width: int = 0) -> Glyph:
+    """
+    Rasterize `char` once per font, size and stroke width.
+
+    The stroke mask covers the whole outlined shape (fill included), like
+    Pillow's own stroke pass.
+    """
+    font = get_font(font_filename, font_size)
+    fill, fill_offset = _rasterize(font, char, 0)
+    if not stroke_width:
+        return Glyph(fill, fill_offset, None, (0, 0))
+    stroke, stroke_offset = _rasterize(font, char, stroke_width)
+    return Glyph(fill, fill_offset, stroke, stroke_offset)
+
+
+@lru_cache(maxsize=config.GLYPH_ADVANCE_CACHE_SIZE)
+def _pen_advance(font_filename: str, font_size: int, char: str, following: str) -> float:
+    """Advance from `char` to `following`, kerning included."""
+    font = get_font(font_filename, font_size)
+    if not following:
+        return font.getlength(char)
+    return font.getlength(char + following) - font.getlength(following)
+
+
+def _blit(target: np.ndarray, mask: np.ndarray, x: int, y: int) -> None:
+    region = target[y:y + mask.shape[0], x:x + mask.shape[1]]
+    np.maximum(region, mask, out=region)
+
+
+def draw_text_line(
+    image: Image.Image,
+    xy: Tuple[int, int],
+    text: str,
+    font_filename: Union[str, Path],
+    font_size: int,
+    fill: Tuple[int, ...] = (255, 255, 255),
+    stroke_width: int = 0,
+    stroke_fill: Optional[Tuple[int, ...]] = None
+) -> None:
+    """
+    Draw one line of text like `ImageDraw.text`, from cached glyph masks.
+
+    Glyph masks are blitted at their kerned pen positions into a stroke and
+    a fill layer (overlaps keep the highest coverage, as FreeType does), then
+    the stroke colour and the fill colour are pasted through them.
+    """
+    font_filename = str(font_filename)
+    glyphs = []
+    pen = 0.0
+    for i, char in enumerate(text):
+        glyphs.append((round(pen), get_glyph(font_filename, font_size, char, stroke_width)))
+        pen += _pen_advance(font_filename, font_size, char, text[i + 1:i + 2])
+
+    layers = [('fill', 'fill_offset', fill)]
+    if stroke_width and stroke_fill is not None:
+        layers.insert(0, ('stroke', 'stroke_offset', stroke_fill))
+
+    for mask_name, offset_name, color in layers:
+        placed = [
+            (getattr(glyph, mask_name), x + getattr(glyph, offset_name)[0], getattr(glyph, offset_name)[1])
+            for x, glyph in glyphs if getattr(glyph, mask_name) is not None
+        ]
+        if not placed:
+            continue
+
+        left = min(x for _, x, _ in placed)
+        top = min(y for _, _, y in placed)
+        right = max(x + mask.shape[1] for mask, x, _ in placed)
+        bottom = max(y + mask.shape[0] for mask, _, y in placed)
+
+        layer = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for mask, x, y in placed:
+            _blit(layer, mask, x - left, y - top)
+
+        origin = (int(xy[0]) + left, int(xy[1]) + top)
+        image.paste(
+            color,
+            (origin[0], origin[1], origin[0] + layer.shape[1], origin[1] + layer.shape[0]),
+            Image.fromarray(layer, 'L')
+        )
@@ -2,10 +2,16 @@
 
 from __future__ import annotations
 from typing import Optional, Tuple, Union
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 from pathlib import Path
-import config
-from logger import logger
+from .font_cache import get_font
+from .font_fit import fit_font_size
+from .glyph_atlas import draw_text_line
+from .text_layout import Layout, layout_text
+
+__all__ = [
+    "ImageText",
+]
 
 class ImageText:
     """Enhanced image text processor with better error handling."""
@@ -51,17 +57,10 @@ class ImageText:
 
     def get_text_size(self, font_filename: str, font_size: int, text: str) -> Tuple[int, int]:
         """Get the size of text with given font and size."""
-        try:
-            font = ImageFont.truetype(font_filename, font_size)
-            # Use textbbox for better compatibility with newer Pillow versions
-            bbox = self.draw.textbbox((0, 0), text, font=font)
-            return (bbox[2] - bbox[0], bbox[3] - bbox[1])
-        except OSError:
-            # Fallback to default font if custom font fails
-            logger.warning(f"Could not load font {font_filename}, using default")
-            font = ImageFont.load_default()
-            bbox = self.draw.textbbox((0, 0), text, font=font)
-            return (bbox[2] - bbox[0], bbox[3] - bbox[1])
+        font = get_font(font_filename, font_size)
+        # Use textbbox for better compatibility with newer Pillow versions
+        bbox = self.draw.textbbox((0, 0), text, font=font)
+        return (bbox[2] - bbox[0], bbox[3] - bbox[1])
 
     def get_font_size(
         self, 
@@ -73,20 +72,8 @@ class ImageText:
         """Get the maximum font size that fits within the given constraints."""
         if max_width is None and max_height is None:
             raise ValueError('You need to pass max_width or max_height')
-        
-        font_size = 1
-        while True:
-            text_size = self.get_text_size(font, font_size, text)
-            if (max_width is not None and text_size[0] > max_width) or \
-               (max_height is not None and text_size[1] > max_height):
-                return max(1, font_size - 1)
-            font_size += 1
-            
-            # Prevent infinite loop
-            if font_size > 500:
-                break
-                
-        return font_size
+
+        return fit_font_size(text, font, max_width, max_height=max_height)
 
     def write_text(
         self,
@@ -108,11 +95,7 @@ class ImageText:
         
         text_size = self.get_text_size(font_filename, font_size, text)
         
-        try:
-            font = ImageFont.truetype(font_filename, font_size)
-        except OSError:
-            logger.warning(f"Could not load font {font_filename}, using default")
-            font = ImageFont.load_default()
+        font = get_font(font_filename, font_size)
         
         if x == 'center':
             x = (self.size[0] - text_size[0]) // 2
@@ -134,82 +117,73 @@ class ImageText:
         line_spacing: float = 1.1
     ) -> int:
         """Get a suitable font size for text that fits in a box."""
-        font_size = 8
-        jump_size = 32
-        words = text.split()
-        lower_bound = 0.1
-        upper_bound = 0.2
-
-        while jump_size >= 1:
-            lines = []
-            line = []
-            
-            for word in words:
-                new_line = ' '.join(line + [word])
-                size = self.get_text_size(font_filename, font_size, new_line)
-                
-                if size[0] <= box_width:
-                    line.append(word)
-                else:
-                    if line:
-                        lines.append(line)
-                    line = [word]
-            
-            if line:
-                lines.append(line)
-
-            if not lines:
-                break
-
-            text_height = size[1] * line_spacing
-            total_size = len(lines) * text_height
-            new_upper = upper_bound + 0.02 * len(lines)
-
-            if lower_bound * self.size[1] <= total_size <= new_upper * self.size[1]:
-                break
-            elif total_size < lower_bound * self.size[1]:
-                font_size += jump_size
-            else:
-                jump_size //= 2
-                font_size = max(1, font_size - jump_size)
+        return fit_font_size(
+            text, font_filename, box_width, self.size[1], line_spacing=line_spacing
+        )
 
-        return max(1, font_size)
+    def layout_text(
+        self,
+        text: str,
+        box_width: int,
+        font_filename: str,
+        font_size: Optional[int] = None,
+        line_spacing: float = 1.1
+    ) -> Layout:
+        """Wrap text into a box, picking a suitable font size if none is given."""
+        if font_size is None:
+            font_size = self.get_suitable_font_size(
+                text, box_width, font_filename, line_spacing
+            )
+        return layout_text(text, font_filename, font_size, box_width, line_spacing)
 
     def write_text_box(
         self,
         xy: Tuple[int, int],
         text: str,
         box_width: int,
-        font_filename: str,
+        font_filename: Union[str, Path],
         font_size: Optional[int] = None,
         color: Tuple[int, int, int] = (255, 255, 255),
         place: str = 'left',
         justify_last_line: bool = False,
         position: str = 'top',
         line_spacing: float = 1.1,
-        stroke: bool = False
+        stroke: bool = False,
+        layout: Optional[Layout] = None
     ) -> Tuple[int, int]:
         """Write text in a box with word wrapping."""
-        x, y = xy
-        
-        if font_size is None:
-            font_size = self.get_suitable_font_size(
-                text, box_width, font_filename, line_spacing
+        if layout is None:
+            layout = self.layout_text(
+                text, box_width, font_filename, font_size, line_spacing
             )
 
-        stroke_width = max(1, font_size // 20) if stroke else 0
-        stroke_fill = (0, 0, 0) if stroke else None
+        return self.draw_layout(
+            xy, layout, box_width, color, place,
+            justify_last_line, position, stroke
+        )
 
-        # Split text into lines
-        lines = self._wrap_text(text, box_width, font_filename, font_size)
-        
-        if not lines:
+    def draw_layout(
+        self,
+        xy: Tuple[int, int],
+        layout: Layout,
+        box_width: int,
+        color: Tuple[int, int, int] = (255, 255, 255),
+        place: str = 'left',
+        justify_last_line: bool = False,
+        position: str = 'top',
+        stroke: bool = False
+    ) -> Tuple[int, int]:
+        """Draw an already wrapped layout in a box."""
+        x, y = xy
+
+        if not layout.lines:
             return (box_width, 0)
 
-        # Calculate text height
-        sample_size = self.get_text_size(font_filename, font_size, lines[0])
-        text_height = sample_size[1] * line_spacing
-        total_height = len(lines) * text_height
+        stroke_width = max(1, layout.font_size // 20) if stroke else 0
+        stroke_fill = (0, 0, 0) if stroke else None
+
+        text_height = layout.line_height
+        total_height = layout.total_height
 
         # Calculate starting y position
         if position == 'middle':
@@ -221,41 +195,21 @@ class ImageText:
 
         # Draw each line
         current_y = start_y
-        for i, line in enumerate(lines):
+        for i, (line, line_width) in enumerate(zip(layout.lines, layout.widths)):
             self._draw_line(
-                line, x, current_y, box_width, font_filename, font_size,
-                color, place, justify_last_line and i == len(lines) - 1,
+                line, line_width, x, current_y, box_width, layout.font_filename,
+                layout.font_size, color, place,
+                justify_last_line and i == len(layout.lines) - 1,
                 stroke_width, stroke_fill
             )
             current_y += text_height
 
         return (box_width, current_y - start_y)
 
-    def _wrap_text(self, text: str, box_width: int, font_filename: str, font_size: int) -> list[str]:
-        """Wrap text to fit within box width."""
-        lines = []
-        line = []
-        words = text.split()
-
-        for word in words:
-            new_line = ' '.join(line + [word])
-            size = self.get_text_size(font_filename, font_size, new_line)
-            
-            if size[0] <= box_width:
-                line.append(word)
-            else:
-                if line:
-                    lines.append(' '.join(line))
-                line = [word]
-        
-        if line:
-            lines.append(' '.join(line))
-
-        return lines
-
     def _draw_line(
         self,
         line: str,
+        line_width: int,
         x: int,
         y: int,
         box_width: int,
@@ -267,36 +221,32 @@ class ImageText:
         stroke_width: int,
         stroke_fill: Optional[Tuple[int, int, int]]
     ):
-        """Draw a single line of text."""
-        if place == 'left':
-            self.write_text(
-                (x, y), line, font_filename, font_size, color,
-                stroke_width=stroke_width, stroke_fill=stroke_fill
-            )
-        elif place == 'right':
-            text_size = self.get_text_size(font_filename, font_size, line)
-            x_pos = x + box_width - text_size[0]
-            self.write_text(
-                (x_pos, y), line, font_filename, font_size, color,
-                stroke_width=stroke_width, stroke_fill=stroke_fill
-            )
+        """Draw a single line of text whose width is already known."""
+        if place == 'right':
+            x_pos = x + box_width - line_width
         elif place == 'center':
-            text_size = self.get_text_size(font_filename, font_size, line)
-            x_pos = x + (box_width - text_size[0]) // 2
-            self.write_text(
-                (x_pos, y), line, font_filename, font_size, color,
-                stroke_width=stroke_width, stroke_fill=stroke_fill
-            )
+            x_pos = x + (box_width - line_width) // 2
         elif place == 'justify' and justify:
             self._draw_justified_line(
                 line, x, y, box_width, font_filename, font_size, color,
                 stroke_width, stroke_fill
             )
+            return
         else:
-            self.write_text(
-                (x, y), line, font_filename, font_size, color,
-                stroke_width=stroke_width, stroke_fill=stroke_fill
+            x_pos = x
+
+        # Stroking is slow in FreeType, outlined glyphs come from the atlas
+        if stroke_width and stroke_fill is not None:
+            draw_text_line(
+                self.image, (x_pos, y), line, font_filename, font_size,
+                color, stroke_width, stroke_fill
             )
+            return
+
+        self.draw.text(
+            (x_pos, y), line, font=get_font(font_filename, font_size), fill=color,
+            stroke_fill=stroke_fill, stroke_width=stroke_width
+        )
 
     def _draw_justified_line(
         self,
@@ -0,0 +1,263 @@
+"""Fair scheduling of expensive jobs across guilds, with a bounded queue."""
+
+from __future__ import annotations
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+import time
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Set
+
+import config
+from logger import logger
+
+__all__ = [
+    "PositionCallback",
+    "PositionBroadcast",
+    "QueueFull",
+    "FairScheduler",
+]
+
+PositionCallback = Callable[[int], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    """The scheduler queue has no room for another job."""
+
+
+class PositionBroadcast:
+    """
+    Fan the queue positions of one job out to everyone waiting on it.
+
+    The broadcast itself is the `on_position` callback of the job. Callbacks
+    added while the job waits are sent the latest position right away.
+    """
+
+    def __init__(self) -> None:
+        self._callbacks: List[PositionCallback] = []
+        self.position: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._callbacks)
+
+    async def add(self, callback: PositionCallback) -> None:
+        self._callbacks.append(callback)
+        if self.position:
+            try:
+                await callback(self.position)
+            except Exception as e:
+                logger.warning(f"Queue position callback failed: {e}")
+
+    def remove(self, callback: PositionCallback) -> None:
+        self._callbacks.remove(callback)
+
+    async def __call__(self, position: int) -> None:
+        self.position = position
+        await asyncio.gather(*(callback(position) for callback in list(self._callbacks)))
+
+
+@dataclass(eq=False)
+class _Ticket:
+    owner: Hashable
+    granted: asyncio.Future[None]
+    on_position: Optional[PositionCallback]
+    enqueued_at: float = field(default_factory=time.monotonic)
+    position: int = 0  # latest position, 0 once started
+    sent: Optional[int] = None  # last position passed to on_position
+    notified_at: float = 0.0
+    pending: Optional[asyncio.TimerHandle] = None
+
+
+class FairScheduler:
+    """
+    Admit at most `max_running` jobs at once, and `max_per_owner` per owner.
+
+    Owners are usually guilds. Waiting jobs are queued per owner and started
+    round-robin across owners, so a busy guild only delays the others by one
+    job per turn. At most `max_queued` jobs wait in total; more are rejected
+    with `QueueFull`. Waiting jobs can be told their position in the queue.
+    """
+
+    def __init__(
+        self,
+        max_running: int = config.MEDIA_MAX_RUNNING_JOBS,
+        max_per_owner: int = config.MEDIA_MAX_JOBS_PER_GUILD,
+        max_queued: int = config.MEDIA_MAX_QUEUED_JOBS,
+        update_interval: float = config.MEDIA_QUEUE_UPDATE_INTERVAL
+    ) -> None:
+        self.max_running = max_running
+        self.max_per_owner = max_per_owner
+        self.max_queued = max_queued
+        self.update_interval = update_interval
+
+        # Round-robin order: the owner served last is moved to the end
+        self._queues: OrderedDict[Hashable, Deque[_Ticket]] = OrderedDict()
+        self._running: Dict[Hashable, int] = {}
+        self._running_total = 0
+        self._queued_total = 0
+
+        self.completed = 0
+        self.rejected = 0
+        self._waits: Deque[float] = deque(maxlen=config.MEDIA_QUEUE_WAIT_SAMPLES)
+        # Position callbacks in flight, referenced so they are not garbage collected
+        self._callbacks: Set[asyncio.Task[None]] = set()
+
+    @property
+    def queued(self) -> int:
+        return self._queued_total
+
+    @property
+    def running(self) -> int:
+        return self._running_total
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        owner: Hashable,
+        on_position: Optional[PositionCallback] = None
+    ) -> AsyncIterator[None]:
+        """
+        Wait for a turn to run a job for `owner`.
+
+        `on_position` is called with the position in the queue (1 for next)
+        while waiting, at most every `update_interval` seconds: a change
+        coming sooner is sent once the interval is over, if it still holds.
+        It is called with 0 once the job starts.
+
+        Raises
+        -------
+        QueueFull
+            If the job cannot even be queued
+        """
+        ticket = self._enqueue(owner, on_position)
+        try:
+            await ticket.granted
+        except asyncio.CancelledError:
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                self._release(owner)
+            else:
+                self._remove(ticket)
+            raise
+
+        self._waits.append(time.monotonic() - ticket.enqueued_at)
+        try:
+            yield
+        finally:
+            self.completed += 1
+            self._release(owner)
+
+    def _enqueue(self, owner: Hashable, on_position: Optional[PositionCallback]) -> _Ticket:
+        ticket = _Ticket(owner, asyncio.get_running_loop().create_future(), on_position)
+
+        if self._queued_total >= self.max_queued and not self._can_run(owner):
+            self.rejected += 1
+            logger.warning(f"Job queue full, rejected a job of {owner}")
+            raise QueueFull()
+
+        self._queues.setdefault(owner, deque()).append(ticket)
+        self._queued_total += 1
+        self._dispatch()
+        return ticket
+
+    def _can_run(self, owner: Hashable) -> bool:
+        return self._running_total < self.max_running and \
+            self._running.get(owner, 0) < self.max_per_owner
+
+    def _start(self, ticket: _Ticket) -> None:
+        self._running[ticket.owner] = self._running.get(ticket.owner, 0) + 1
+        self._running_total += 1
+        ticket.granted.set_result(None)
+        self._cancel_pending(ticket)
+        ticket.position = 0
+        self._notify(ticket)
+
+    def _release(self, owner: Hashable) -> None:
+        self._running[owner] -= 1
+        if not self._running[owner]:
+            del self._running[owner]
+        self._running_total -= 1
+        self._dispatch()
+
+    def _remove(self, ticket: _Ticket) -> None:
+        queue = self._queues.get(ticket.owner)
+        self._cancel_pending(ticket)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            self._queued_total -= 1
+            if not queue:
+                del self._queues[ticket.owner]
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Start queued jobs round-robin while there is room, then update positions."""
+        while self._running_total < self.max_running:
+            owner = next((owner for owner in self._queues if self._can_run(owner)), None)
+            if owner is None:
+                break
+
+            queue = self._queues.pop(owner)
+            ticket = queue.popleft()
+            self._queued_total -= 1
+            if queue:
+                self._queues[owner] = queue
+            self._start(ticket)
+
+        for position, ticket in enumerate(self._service_order(), start=1):
+            ticket.position = position
+            self._notify(ticket)
+
+    def _service_order(self) -> List[_Ticket]:
+        """Queued tickets in the order they would start if nothing else arrived."""
+        order = []
+        queues = [list(queue) for queue in self._queues.values()]
+        for turn in range(max((len(queue) for queue in queues), default=0)):
+            order.extend(queue[turn] for queue in queues if turn < len(queue))
+        return order
+
+    def _notify(self, ticket: _Ticket) -> None:
+        """Send the ticket's position if it changed, or schedule it if the last one is too recent."""
+        if ticket.on_position is None or ticket.position == ticket.sent or ticket.pending is not None:
+            return
+        wait = ticket.notified_at + self.update_interval - time.monotonic()
+        if ticket.position and wait > 0:
+            ticket.pending = asyncio.get_running_loop().call_later(wait, self._send_pending, ticket)
+            return
+
+        ticket.sent = ticket.position
+        ticket.notified_at = time.monotonic()
+        task = asyncio.get_running_loop().create_task(self._call(ticket.on_position, ticket.position))
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    def _send_pending(self, ticket: _Ticket) -> None:
+        ticket.pending = None
+        self._notify(ticket)
+
+    @staticmethod
+    def _cancel_pending(ticket: _Ticket) -> None:
+        if ticket.pending is not None:
+            ticket.pending.cancel()
+            ticket.pending = None
+
+    async def _call(self, callback: PositionCallback, position: int) -> None:
+        try:
+            await callback(position)
+        except Exception as e:
+            logger.warning(f"Queue position callback failed: {e}")
+
+    def info(self) -> Dict[str, float]:
+        """Queue depth, wait times and counters, for monitoring."""
+        waits = sorted(self._waits)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            'running': self._running_total,
+            'queued': self._queued_total,
+            'guilds_waiting': len(self._queues),
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'wait_p50': percentile(0.5),
+            'wait_p95': percentile(0.95),
+        }
@@ -0,0 +1,110 @@
+"""Decode incoming media at the resolution it will be rendered at."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from io import BytesIO
+import math
+from typing import Tuple
+
+from PIL import Image
+
+import config
+
+__all__ = [
+    "DecodePlan",
+    "plan_decode",
+    "open_media",
+    "scale_frame",
+]
+
+
+@dataclass(frozen=True)
+class DecodePlan:
+    """Output size of a decoded image, and which of its frames to keep."""
+
+    size: Tuple[int, int]
+    stride: int = 1
+
+
+def _fit(size: Tuple[int, int], scale: float) -> Tuple[int, int]:
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+def plan_decode(
+    size: Tuple[int, int],
+    n_frames: int = 1,
+    max_dimension: int = config.MEDIA_MAX_DIMENSION,
+    pixel_budget: int = config.MEDIA_PIXEL_BUDGET,
+    min_dimension: int = config.MEDIA_MIN_DIMENSION,
+    scale: float = 1.0
+) -> DecodePlan:
+    """
+    Pick the output size and frame stride of an image.
+
+    The image is first shrunk to fit `max_dimension`. If width x height x
+    frames still exceeds `pixel_budget`, it is shrunk further, but its longest
+    side is kept above `min_dimension`; past that point, frames are dropped
+    instead (their durations are merged into the kept ones).
+
+    `scale` shrinks the result further, to make the output smaller.
+    """
+    width, height = size
+    longest = max(width, height)
+    factor = min(1.0, max_dimension / longest)
+
+    pixels = width * height * factor ** 2 * n_frames
+    if pixels > pixel_budget:
+        floor = min(1.0, min_dimension / longest)
+        factor = max(min(factor, math.sqrt(pixel_budget / (width * height * n_frames))), floor)
+        # Some animations fit the budget only with fewer frames
+        pixels = width * height * factor ** 2 * n_frames
+
+    stride = 1
+    if n_frames > 1 and pixels > pixel_budget * 1.01:
+        stride = min(math.ceil(pixels / pixel_budget), n_frames)
+    return DecodePlan(_fit(size, factor * scale), stride)
+
+
+def open_media(data: bytes, scale: float = 1.0) -> Tuple[Image.Image, DecodePlan]:
+    """
+    Open an image and prepare it to be decoded at its planned size.
+
+    JPEGs are decoded by the codec at a reduced scale (1/2, 1/4 or 1/8) with
+    `Image.draft`, and stills are then shrunk to the planned size. Animations
+    are returned as they are; their frames go through `scale_frame`.
+
+    Return
+    -------
+    The loaded image and its decode plan
+    """
+    img = Image.open(BytesIO(data))
+    n_frames = getattr(img, 'n_frames', 1)
+    plan = plan_decode(img.size, n_frames, scale=scale)
+
+    if n_frames > 1:
+        img.load()
+        return img, plan
+
+    if img.format == 'JPEG' and plan.size != img.size:
+        img.draft(img.mode, plan.size)
+
+    img.load()
+    if img.size != plan.size:
+        fmt = img.format
+        img = scale_frame(img, plan.size)
+        img.format = fmt
+    return img, plan
+
+
+def scale_frame(frame: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    """
+    Resize a decoded frame to `size`.
+
+    Large reductions start with a cheap integer `reduce` (box filter) and
+    only resample the last factor of two with Lanczos.
+    """
+    if frame.size == size:
+        return frame
+    if frame.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        frame = frame.convert('RGBA')
+    return frame.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
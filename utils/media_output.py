@@ -0,0 +1,156 @@
+"""Output encoding: pick the format and settings that fit an upload limit."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageSequence
+
+import config
+
+__all__ = [
+    "EncodedMedia",
+    "EXTENSIONS",
+    "encode_still",
+    "negotiate_still",
+    "gif_to_webp",
+]
+
+EXTENSIONS = {
+    'PNG': 'png',
+    'WEBP': 'webp',
+    'GIF': 'gif',
+    'MP4': 'mp4',
+}
+
+
+@dataclass
+class EncodedMedia:
+    """Encoded output and how it was chosen."""
+
+    data: bytes
+    format: str
+    attempts: int = 1
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def fits(self, size_limit: Optional[int]) -> bool:
+        return size_limit is None or self.size <= size_limit
+
+
+def encode_still(img: Image.Image, fmt: str, quality: Optional[int] = None) -> bytes:
+    """
+    Encode a still image as PNG or lossy WebP.
+
+    PNGs are lossless and saved at `MEDIA_PNG_COMPRESS_LEVEL`, or the best
+    level for palette images, which are small enough for it to stay cheap.
+    `quality` only applies to WebP.
+    """
+    with BytesIO() as output:
+        if fmt == 'WEBP':
+            img.save(output, format='WEBP', quality=quality or config.MEDIA_WEBP_QUALITY, method=4)
+        else:
+            level = 9 if img.mode == 'P' else config.MEDIA_PNG_COMPRESS_LEVEL
+            img.save(output, format='PNG', compress_level=level)
+        return output.getvalue()
+
+
+def _png_candidate(img: Image.Image) -> Optional[Image.Image]:
+    """
+    The image to try as a PNG, or None if a WebP is bound to be smaller.
+
+    PNG only pays off for images with alpha, or opaque ones with few colours
+    (text, flat drawings). Those are saved with a palette of exactly their
+    colours, which is still lossless and a third of the data to compress.
+    """
+    if img.mode != 'RGB':
+        return img
+    if img.getcolors(config.MEDIA_PNG_MAX_COLORS) is None:
+        return None
+    # Pillow's quantizer can map close colours together, this cannot
+    pixels = np.asarray(img).astype(np.uint32)
+    keys = pixels[..., 0] << 16 | pixels[..., 1] << 8 | pixels[..., 2]
+    colors, indices = np.unique(keys, return_inverse=True)
+    paletted = Image.fromarray(indices.reshape(keys.shape).astype(np.uint8), 'P')
+    paletted.putpalette(np.stack([colors >> 16, colors >> 8 & 255, colors & 255], axis=1).astype(np.uint8).tobytes())
+    return paletted
+
+
+def _still_attempts(
+    size: Tuple[int, int],
+    png: bool
+) -> Iterable[Tuple[Tuple[int, int], str, Optional[int]]]:
+    """Candidate (size, format, quality), from best looking to smallest."""
+    for scale in config.MEDIA_OUTPUT_SCALES:
+        scaled = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+        for quality in config.MEDIA_WEBP_QUALITIES:
+            yield scaled, 'WEBP', quality
+            if png and scale == 1 and quality == config.MEDIA_WEBP_QUALITIES[0]:
+                yield scaled, 'PNG', None
+
+
+def negotiate_still(img: Image.Image, size_limit: Optional[int] = None) -> EncodedMedia:
+    """
+    Encode a rendered still with the cheapest settings that keep it sharp.
+
+    WebP at the default quality is tried first. For images with alpha or
+    few colours, a full size PNG is tried too and the smaller wins. Fully
+    opaque images drop their alpha channel. While the result is over
+    `size_limit`, the WebP quality, then the scale, are lowered in steps.
+    If nothing fits, the smallest attempt is returned.
+    """
+    if img.mode == 'RGBA' and img.getextrema()[3][0] == 255:
+        img = img.convert('RGB')
+
+    png = _png_candidate(img)
+    best: Optional[EncodedMedia] = None
+    attempts = 0
+
+    for size, fmt, quality in _still_attempts(img.size, png is not None):
+        if fmt == 'PNG':
+            frame = png
+        else:
+            frame = img if size == img.size else img.resize(size, Image.Resampling.LANCZOS)
+        attempts += 1
+        encoded = EncodedMedia(encode_still(frame, fmt, quality), fmt)
+
+        if best is None or encoded.size < best.size:
+            best = encoded
+        # The first WebP and the PNG compete, the other attempts only try to fit
+        if png is not None and attempts == 1:
+            continue
+        if best.fits(size_limit):
+            break
+
+    best.attempts = attempts
+    return best
+
+
+def _durations(gif: Image.Image) -> Sequence[int]:
+    durations = [int(frame.info.get('duration') or 0) for frame in ImageSequence.Iterator(gif)]
+    gif.seek(0)
+    return durations
+
+
+def gif_to_webp(data: bytes, quality: Optional[int] = None) -> bytes:
+    """
+    Re-encode a rendered GIF as an animated WebP, keeping its frame timing.
+
+    Frames are read from the GIF one at a time while the WebP is encoded, so
+    memory stays at about one frame plus the output.
+    """
+    gif = Image.open(BytesIO(data))
+    with BytesIO() as output:
+        gif.save(
+            output, format='WEBP', save_all=True,
+            duration=list(_durations(gif)),
+            loop=gif.info.get('loop', 0),
+            quality=quality or config.MEDIA_WEBP_QUALITY,
+            method=4,
+            background=(0, 0, 0, 0),
+        )
+        return output.getvalue()
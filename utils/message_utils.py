@@ -8,6 +8,15 @@ from discord.ext import commands
 
 from logger import logger
 
+__all__ = [
+    "MessageDestination",
+    "ErrorHandler",
+    "safe_send",
+    "safe_reply",
+    "send",
+    "reply",
+]
+
 MessageDestination = Union[
     discord.TextChannel,
     discord.DMChannel,
@@ -10,6 +10,13 @@ from discord.ext import commands
 
 from logger import logger
 
+__all__ = [
+    "PaginationSource",
+    "EmbedPaginationSource",
+    "PaginationView",
+    "paginate",
+]
+
 T = TypeVar('T')
 
 class PaginationSource(ABC, Generic[T]):
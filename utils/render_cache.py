@@ -0,0 +1,229 @@
+"""Two-tier cache of rendered media: an in-memory LRU over a capped disk store."""
+
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+from threading import Lock
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+
+import config
+from logger import logger
+
+__all__ = [
+    "CacheStats",
+    "RenderCache",
+    "render_cache_key",
+    "normalize_text",
+]
+
+
+def normalize_text(text: Optional[str]) -> Optional[str]:
+    """Collapse whitespace, which the renderers ignore anyway when wrapping."""
+    if text is None:
+        return None
+    return ' '.join(text.split())
+
+
+def render_cache_key(source: bytes, command: str, texts: Tuple[Optional[str], ...], **params: Any) -> str:
+    """
+    Content-addressed key of a render.
+
+    Made of the hash of the source bytes, the command, its normalized texts
+    and every other parameter that changes the output (e.g. the size limit).
+    """
+    payload = json.dumps(
+        {
+            'source': hashlib.sha256(source).hexdigest(),
+            'command': command,
+            'texts': [normalize_text(text) for text in texts],
+            'params': params,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Counters of a `RenderCache`."""
+
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class RenderCache:
+    """
+    Rendered outputs keyed by `render_cache_key`.
+
+    Recently used entries stay in memory, up to `memory_bytes`. Every entry is
+    also written to `directory`, which is trimmed to `disk_bytes` by evicting
+    the least recently used files. Entries older than `ttl` seconds are
+    dropped from both tiers. Methods are blocking and thread-safe; disk access
+    is meant to run through `asyncio.to_thread`.
+
+    Nothing here is specific to renders: with `memory_bytes=0` it is a plain
+    disk cache of bytes, as used by `Downloader`.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, Path] = config.RENDER_CACHE_DIR,
+        memory_bytes: int = config.RENDER_CACHE_MEMORY_BYTES,
+        disk_bytes: int = config.RENDER_CACHE_DISK_BYTES,
+        ttl: float = config.RENDER_CACHE_TTL
+    ) -> None:
+        self.directory = Path(directory)
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+        # key -> (data, format, created)
+        self._memory: OrderedDict[str, Tuple[bytes, str, float]] = OrderedDict()
+        self._memory_size = 0
+        # key -> (path, size, created), in least recently used order
+        self._disk: OrderedDict[str, Tuple[Path, int, float]] = OrderedDict()
+        self._disk_size = 0
+        self._lock = Lock()
+
+        if disk_bytes > 0:
+            self._load_index()
+
+    def _load_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.iterdir():
+            if path.is_file() and not path.name.endswith('.tmp'):
+                stat = path.stat()
+                files.append((stat.st_atime, path, stat.st_size, stat.st_mtime))
+
+        for _, path, size, created in sorted(files):
+            self._disk[path.stem] = (path, size, created)
+            self._disk_size += size
+        logger.info(f"Cache {self.directory} has {len(self._disk)} entries ({self._disk_size} bytes)")
+
+    def _expired(self, created: float) -> bool:
+        return time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """Get the (data, format) stored under `key`, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                data, fmt, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return data, fmt
+                self._drop_memory(key)
+                self.stats.expirations += 1
+
+            entry = self._disk.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            path, _, created = entry
+            if self._expired(created):
+                self._drop_disk(key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+
+            try:
+                data = path.read_bytes()
+            except OSError:
+                self._drop_disk(key)
+                self.stats.misses += 1
+                return None
+
+            self._disk.move_to_end(key)
+            fmt = path.suffix.lstrip('.').upper()
+            self._remember(key, data, fmt, created)
+            self.stats.disk_hits += 1
+            return data, fmt
+
+    def put(self, key: str, data: bytes, fmt: str) -> None:
+        """Store `data`, encoded as `fmt`, under `key` in both tiers."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, data, fmt, created)
+
+            if len(data) > self.disk_bytes:
+                return
+            path = self.directory / f"{key}.{fmt.lower()}"
+            tmp = path.with_name(path.name + '.tmp')
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not write cache entry {key}: {e}")
+                return
+
+            if key in self._disk:
+                self._drop_disk(key, unlink=False)
+            self._disk[key] = (path, len(data), created)
+            self._disk_size += len(data)
+
+            while self._disk_size > self.disk_bytes:
+                self._drop_disk(next(iter(self._disk)))
+                self.stats.evictions += 1
+
+    def _remember(self, key: str, data: bytes, fmt: str, created: float) -> None:
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._drop_memory(key)
+        self._memory[key] = (data, fmt, created)
+        self._memory_size += len(data)
+
+        while self._memory_size > self.memory_bytes:
+            self._drop_memory(next(iter(self._memory)))
+            self.stats.evictions += 1
+
+    def _drop_memory(self, key: str) -> None:
+        data, _, _ = self._memory.pop(key)
+        self._memory_size -= len(data)
+
+    def _drop_disk(self, key: str, unlink: bool = True) -> None:
+        path, size, _ = self._disk.pop(key)
+        self._disk_size -= size
+        if unlink:
+            path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            for key in list(self._disk):
+                self._drop_disk(key)
+
+    def info(self) -> Dict[str, Any]:
+        """Sizes and counters, for monitoring."""
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_size,
+                'memory_hits': self.stats.memory_hits,
+                'disk_hits': self.stats.disk_hits,
+                'misses': self.stats.misses,
+                'evictions': self.stats.evictions,
+                'expirations': self.stats.expirations,
+                'hit_rate': self.stats.hit_rate,
+            }
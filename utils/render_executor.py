@@ -0,0 +1,84 @@
+"""Executor for CPU-bound media rendering, kept off the asyncio event loop."""
+
+from __future__ import annotations
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Iterable, TypeVar, Union
+
+import config
+from logger import logger
+from .font_cache import font_registry
+
+__all__ = [
+    "RenderExecutor",
+    "warm_up_worker",
+]
+
+T = TypeVar("T")
+
+
+def warm_up_worker(fonts: Iterable[Union[str, Path]]) -> None:
+    """Worker initializer: load fonts before the first job arrives."""
+    for font in fonts:
+        font_registry.load_file(font)
+
+
+def _noop() -> None:
+    pass
+
+
+class RenderExecutor:
+    """
+    Pool of render workers.
+
+    A process pool (the default) spreads jobs over every core, a thread pool
+    only keeps the event loop responsive. Jobs must be module-level functions
+    taking and returning picklable values, usually bytes.
+    """
+
+    def __init__(
+        self,
+        kind: str = config.MEDIA_EXECUTOR,
+        max_workers: int = config.MEDIA_WORKERS,
+        fonts: Iterable[Union[str, Path]] = (config.IMPACT_FONT,)
+    ) -> None:
+        self.kind = kind
+        self.max_workers = max_workers
+        initargs = (tuple(str(font) for font in fonts),)
+
+        if kind == "process":
+            # Forking a process that runs an event loop and threads is unsafe
+            self._executor: Executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up_worker,
+                initargs=initargs,
+            )
+        elif kind == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="render",
+                initializer=warm_up_worker,
+                initargs=initargs,
+            )
+        else:
+            raise ValueError(f"Unknown media executor: {kind}")
+
+        logger.info(f"Started {kind} render executor with {max_workers} workers")
+
+    def warm(self) -> None:
+        """Start every worker now instead of on the first jobs."""
+        for _ in range(self.max_workers):
+            self._executor.submit(_noop)
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `fn` in a worker and wait for its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the workers, dropping queued jobs."""
+        self._executor.shutdown(wait=wait, cancel_futures=True)
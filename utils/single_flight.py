@@ -0,0 +1,53 @@
+"""Deduplicate concurrent identical coroutines."""
+
+from __future__ import annotations
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+__all__ = [
+    "SingleFlight",
+]
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Registry of in-flight jobs, keyed by what they compute.
+
+    While a job runs, callers asking for the same key await the same task
+    instead of starting another one. The key is forgotten as soon as the job
+    ends, so results are not cached.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: Dict[Hashable, asyncio.Task[T]] = {}
+        self.started = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await the job running under `key`, starting it with `factory` if none is.
+
+        A caller that gets cancelled does not cancel the job for the others.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._tasks[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.started += 1
+        else:
+            self.shared += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task[T]) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        # Every waiter may have been cancelled, mark the error as seen
+        if not task.cancelled():
+            task.exception()
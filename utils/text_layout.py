@@ -0,0 +1,129 @@
+"""Word-wrap layout engine with cached glyph advances."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple, Union
+
+import config
+from .font_cache import get_font
+
+__all__ = [
+    "Layout",
+    "layout_text",
+]
+
+
+@dataclass(frozen=True)
+class Layout:
+    """Wrapped text, ready to be measured or drawn."""
+
+    lines: Tuple[str, ...]
+    widths: Tuple[int, ...]
+    line_height: float
+    font_filename: str
+    font_size: int
+
+    @property
+    def total_height(self) -> float:
+        """Height of every line, including line spacing."""
+        return len(self.lines) * self.line_height
+
+    @property
+    def width(self) -> int:
+        """Width of the widest line."""
+        return max(self.widths, default=0)
+
+    @property
+    def font(self):
+        """The sized font this layout was measured with."""
+        return get_font(self.font_filename, self.font_size)
+
+
+@lru_cache(maxsize=config.GLYPH_ADVANCE_CACHE_SIZE)
+def _advance(font_filename: str, font_size: int, text: str) -> float:
+    """Advance width of `text`, measured once per font size."""
+    return get_font(font_filename, font_size).getlength(text)
+
+
+def _ink_size(font_filename: str, font_size: int, text: str) -> Tuple[int, int]:
+    bbox = get_font(font_filename, font_size).getbbox(text)
+    return (bbox[2] - bbox[0], bbox[3] - bbox[1])
+
+
+@lru_cache(maxsize=config.LAYOUT_CACHE_SIZE)
+def layout_text(
+    text: str,
+    font_filename: Union[str, Path],
+    font_size: int,
+    box_width: int,
+    line_spacing: float = 1.1
+) -> Layout:
+    """
+    Greedily wrap `text` into lines no wider than `box_width`.
+
+    Lines are built by summing cached word and space advances, so each word
+    is measured once per font size. The real (kerned) width of a line is only
+    measured when the estimate gets close to the edge of the box, and once more
+    per finished line to get the widths used for alignment.
+
+    Parameters
+    -------
+    text: str
+        The text to wrap, split on whitespace
+    font_filename: str | Path
+        Path of the TrueType font
+    font_size: int
+        Size of the font
+    box_width: int
+        Maximum width of a line, in pixels
+    line_spacing: float
+        Multiplier applied to the line height
+
+    Return
+    -------
+    The cached `Layout` for these arguments
+    """
+    font_filename = str(font_filename)
+    space = _advance(font_filename, font_size, ' ')
+    overhang = font_size * 0.1
+
+    lines: list[str] = []
+    line: list[str] = []
+    line_width = 0.0
+
+    for word in text.split():
+        word_width = _advance(font_filename, font_size, word)
+
+        if not line:
+            line = [word]
+            line_width = word_width
+            continue
+
+        # Side bearings can push the ink past the summed advances, so only
+        # lines close to the edge are measured for real
+        candidate = line_width + space + word_width
+        if candidate + overhang <= box_width or \
+           _ink_size(font_filename, font_size, ' '.join(line + [word]))[0] <= box_width:
+            line.append(word)
+            line_width = candidate
+        else:
+            lines.append(' '.join(line))
+            line = [word]
+            line_width = word_width
+
+    if line:
+        lines.append(' '.join(line))
+
+    if not lines:
+        return Layout((), (), 0.0, font_filename, font_size)
+
+    sizes = [_ink_size(font_filename, font_size, line) for line in lines]
+    return Layout(
+        lines=tuple(lines),
+        widths=tuple(size[0] for size in sizes),
+        line_height=sizes[0][1] * line_spacing,
+        font_filename=font_filename,
+        font_size=font_size,
+    )
@@ -3,6 +3,10 @@
 import discord
 from typing import Optional
 
+__all__ = [
+    "TimeoutView",
+]
+
 class TimeoutView(discord.ui.View):
     """A view that shows when something has timed out."""
     